@@ -1,26 +1,155 @@
 # api_service.py
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
+import contextvars
 import logging
+import signal
+import sys
+import config
+import logConfig
+import metrics
+import resilience
+from jobQueue import JobQueue, QueueFull
+from resultCache import ResultCache
+from werkzeug.serving import make_server
+from workers import prefork, worker_index
 from serviceComposite import ServiceComposite
-import re
+from parsedApplication import ParsedApplication
+import math
 import time
 
 # Setup logging
-logging.basicConfig(level=logging.DEBUG)
+logConfig.setup_logging('api')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*", "methods": ["GET", "POST"], "allow_headers": ["Content-Type"]}})
+CORS(app, resources={r"/*": {"origins": "*", "methods": ["GET", "POST"], "allow_headers": ["Content-Type", "Prefer", logConfig.REQUEST_ID_HEADER, logConfig.TRACE_HEADER], "expose_headers": ["Location", "Retry-After", "X-Cache", logConfig.REQUEST_ID_HEADER]}})
 
 # Initialize service
 service = ServiceComposite()
 
+# Stage durations of the current request, sent back in a Server-Timing
+# header so clients (see loadTest.py) can tell where the time went
+stage_timings = contextvars.ContextVar('stage_timings', default=None)
+
+
+def record_stage_timing(stage, seconds):
+    timings = stage_timings.get()
+    if timings is not None:
+        timings[stage] = seconds
+
+
+service.stage_observer = record_stage_timing
+
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'loan_http_request_seconds', "API request time, including Flask", ('endpoint', 'method', 'status'))
+
+
+@app.before_request
+def start_stage_timings():
+    g.request_start = time.perf_counter()
+    g.request_id = logConfig.bind_request_headers(request.headers)
+    stage_timings.set({})
+
+
+@app.after_request
+def add_server_timing(response):
+    timings = stage_timings.get()
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(
+            f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()
+        )
+    response.headers[logConfig.REQUEST_ID_HEADER] = g.request_id
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint,
+                                 method=request.method, status=response.status_code)
+    return response
+
 @app.route('/')
 def home():
     return "Service is running"
 
+@app.route('/health')
+def health():
+    # Still ready with an open circuit: the API answers, fast, with 503s
+    circuits = resilience.circuit_states()
+    degraded = any(circuit['state'] != resilience.CLOSED for circuit in circuits.values())
+    return jsonify({'status': 'degraded' if degraded else 'ready', 'service': 'api', 'circuits': circuits})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+def get_client_id(application):
+    """Client ID from the application email, or a generated one"""
+    return application.email or f"client_{time.time()}"
+
+def run_application(client_id, application):
+    """(JSON body, HTTP status) of processing one parsed application"""
+    try:
+        result = service.process_and_store(client_id, application)
+        return {
+            'status': 'success',
+            'client_id': client_id,
+            'client_data': result['client_data'],
+            'property_evaluation': result['property_evaluation'],
+            'approval_decision': result['approval_decision']
+        }, 200
+
+    except ValueError as ve:
+        # Handle property non-compliance or other validation errors
+        return {
+            'status': 'error',
+            'message': 'Demande non valide',
+            'evaluation': str(ve)
+        }, 400
+
+# Resubmissions of an application (retries, double clicks, re-imports) get the
+# result of its first run instead of running the pipeline and overwriting
+# the client record again
+results = ResultCache(config.RESULT_CACHE_SIZE, config.RESULT_CACHE_TTL)
+
+def process_application(client_id, application):
+    """run_application() through the result cache: (body, status, cache result).
+
+    The cached body keeps the client ID of the first run, under which the
+    client was stored (IDs of applications without email are generated).
+    """
+    (body, status), cache_result = results.get_or_compute(
+        application.content_key(), lambda: run_application(client_id, application))
+    return body, status, cache_result
+
+def run_job(client_id, application):
+    body, status, _ = process_application(client_id, application)
+    return body, status
+
+# Asynchronous mode: jobs run on the queue workers, clients poll /jobs/<id>
+jobs = JobQueue(run_job, config.JOB_WORKERS, config.JOB_QUEUE_SIZE, config.JOB_RETENTION)
+
+def wants_async():
+    """Asynchronous by configuration, or asked for with "Prefer: respond-async" (RFC 7240)"""
+    if config.WORKERS > 1:
+        # Jobs live in the worker that accepted them, polls may reach another
+        # one: the preference is ignored and the request is answered directly
+        return False
+    prefer = request.headers.get('Prefer', '')
+    return config.ASYNC_PROCESS or 'respond-async' in [p.strip() for p in prefer.split(',')]
+
+def unavailable_response(error):
+    """Response to a request a backend service could not serve in time:
+    503 while its circuit breaker is open, 504 on a timeout or when the
+    request deadline passed"""
+    response = jsonify({
+        'status': 'error',
+        'message': str(error)
+    })
+    if isinstance(error, resilience.CircuitOpen):
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response, 503
+    return response, 504
+
 @app.route('/process', methods=['POST'])
 def process_loan_request():
     try:
@@ -34,31 +163,108 @@ def process_loan_request():
                 'message': 'Aucun contenu fourni'
             }), 400
 
+        # Parse once, every stage works on the parsed application
+        application = ParsedApplication.from_text(content)
+
         # Get client ID from email or generate one
-        email_match = re.search(r'Email:\s*(.*?)(?=\s|$)', content)
-        client_id = email_match.group(1) if email_match else f"client_{time.time()}"
-        
-        # Process request using service composite
-        try:
-            result = service.process_and_store(client_id, content)
-            return jsonify({
-                'status': 'success',
+        client_id = get_client_id(application)
+
+        if wants_async():
+            try:
+                job = jobs.submit(client_id, application)
+            except QueueFull as e:
+                # Turn the request away rather than queueing it without limit
+                response = jsonify({
+                    'status': 'error',
+                    'message': 'Service surchargé, réessayez plus tard'
+                })
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response, 503
+            response = jsonify({
+                'status': 'accepted',
                 'client_id': client_id,
-                'client_data': result['client_data'],
-                'property_evaluation': result['property_evaluation'],
-                'approval_decision': result['approval_decision']
+                'job_id': job.id
             })
+            response.headers['Location'] = f"/jobs/{job.id}"
+            return response, 202
 
-        except ValueError as ve:
-            # Handle property non-compliance or other validation errors
+        # Process request using service composite
+        body, status, cache_result = process_application(client_id, application)
+        response = jsonify(body)
+        response.headers['X-Cache'] = cache_result
+        return response, status
+
+    except Exception as e:
+        if isinstance(e, resilience.CircuitOpen) or resilience.is_timeout(e):
+            logger.warning(f"Backend unavailable: {e}")
+            return unavailable_response(e)
+        logger.error(f"Error processing request: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Tâche inconnue ou expirée'
+        }), 404
+
+    body = {'status': 'success', **job.to_dict()}
+    if job.state == 'done':
+        body['result'], body['result_status'] = job.result
+    elif job.state == 'failed':
+        body['error'] = job.error
+    response = jsonify(body)
+    if job.state in ('queued', 'running'):
+        response.headers['Retry-After'] = '1'
+    return response
+
+@app.route('/process/batch', methods=['POST'])
+def process_loan_batch():
+    try:
+        applications = request.json.get('applications')
+        if not applications or not all(isinstance(a, dict) and a.get('content') for a in applications):
             return jsonify({
                 'status': 'error',
-                'message': 'Demande non valide',
-                'evaluation': str(ve)
+                'message': 'Aucune demande fournie'
             }), 400
 
+        parsed = [ParsedApplication.from_text(a['content']) for a in applications]
+        batch = [(get_client_id(application), application) for application in parsed]
+        outcomes = service.process_batch(batch)
+
+        results = []
+        for (client_id, _), outcome in zip(batch, outcomes):
+            if isinstance(outcome, ValueError):
+                results.append({
+                    'status': 'error',
+                    'client_id': client_id,
+                    'message': 'Demande non valide',
+                    'evaluation': str(outcome)
+                })
+            else:
+                results.append({
+                    'status': 'success',
+                    'client_id': client_id,
+                    'client_data': outcome['client_data'],
+                    'property_evaluation': outcome['property_evaluation'],
+                    'approval_decision': outcome['approval_decision']
+                })
+
+        return jsonify({
+            'status': 'success',
+            'results': results
+        })
+
     except Exception as e:
-        logger.error(f"Error processing request: {e}")
+        if isinstance(e, resilience.CircuitOpen) or resilience.is_timeout(e):
+            logger.warning(f"Backend unavailable: {e}")
+            return unavailable_response(e)
+        logger.error(f"Error processing batch: {e}")
         return jsonify({
             'status': 'error',
             'message': str(e)
@@ -87,16 +293,131 @@ def get_credit_check(client_id):
             'message': str(e)
         }), 404
     except Exception as e:
+        if isinstance(e, resilience.CircuitOpen) or resilience.is_timeout(e):
+            logger.warning(f"Backend unavailable: {e}")
+            return unavailable_response(e)
         logger.error(f"Error checking credit: {e}")
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 500
 
+# Default what-if grid: amounts from 10% to 200% of the amount requested
+WHAT_IF_STEPS = 40
+WHAT_IF_RANGE = (0.1, 2.0)
+
+def parse_amounts(value, name):
+    """Amounts of a what-if axis: a list, or {"start", "stop", "steps"} for
+    evenly spaced amounts. Raises ValueError with a message for the client."""
+    if isinstance(value, dict):
+        try:
+            start, stop, steps = float(value['start']), float(value['stop']), int(value['steps'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{name} : start, stop et steps attendus") from None
+        if steps < 1 or steps > config.WHAT_IF_MAX_POINTS:
+            raise ValueError(f"{name} : steps doit être entre 1 et {config.WHAT_IF_MAX_POINTS}")
+        amounts = [start + (stop - start) * i / max(steps - 1, 1) for i in range(steps)]
+    elif not isinstance(value, list) or not value:
+        raise ValueError(f"{name} : liste de montants ou {{start, stop, steps}} attendu")
+    else:
+        try:
+            amounts = [float(a) for a in value]
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} : montants numériques attendus") from None
+    if not all(math.isfinite(a) and a >= 0 for a in amounts):
+        raise ValueError(f"{name} : montants positifs attendus")
+    return amounts
+
+@app.route('/what-if', methods=['POST'])
+def what_if():
+    """Approval of a processed client over a grid of loan amounts and down payments"""
+    try:
+        body = request.json or {}
+        client_id = body.get('client_id')
+        if not client_id:
+            return jsonify({
+                'status': 'error',
+                'message': 'Aucun client fourni'
+            }), 400
+
+        try:
+            client_data = service.get_client_info(client_id)
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 404
+
+        try:
+            if 'loan_amounts' in body:
+                loan_amounts = parse_amounts(body['loan_amounts'], 'loan_amounts')
+            else:
+                requested = ParsedApplication(client_data).loan_amount
+                if not requested:
+                    raise ValueError("Montant demandé inconnu pour ce client : loan_amounts attendu")
+                low, high = WHAT_IF_RANGE
+                loan_amounts = parse_amounts({'start': requested * low, 'stop': requested * high,
+                                              'steps': WHAT_IF_STEPS}, 'loan_amounts')
+            down_payments = parse_amounts(body.get('down_payments', [0]), 'down_payments')
+            if len(loan_amounts) * len(down_payments) > config.WHAT_IF_MAX_POINTS:
+                raise ValueError(f"Grille trop grande (maximum {config.WHAT_IF_MAX_POINTS} points)")
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+
+        try:
+            result = service.what_if(client_id, loan_amounts, down_payments)
+        except ValueError as ve:
+            # Property non-compliance
+            return jsonify({
+                'status': 'error',
+                'message': 'Demande non valide',
+                'evaluation': str(ve)
+            }), 400
+
+        return jsonify({'status': 'success', 'client_id': client_id, **result})
+
+    except Exception as e:
+        if isinstance(e, resilience.CircuitOpen) or resilience.is_timeout(e):
+            logger.warning(f"Backend unavailable: {e}")
+            return unavailable_response(e)
+        logger.error(f"Error running what-if: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+def check_workers_config():
+    """Settings that cannot work with state split across API workers"""
+    if config.STORAGE != 'sqlite':
+        sys.exit("Plusieurs workers API nécessitent un stockage partagé (LOAN_STORAGE=sqlite)")
+    if config.ASYNC_PROCESS:
+        sys.exit("Le mode asynchrone (LOAN_ASYNC_PROCESS) n'est pas disponible avec plusieurs workers API")
+
+def serve_workers(port):
+    """Serve the app from LOAN_WORKERS processes sharing the port"""
+    check_workers_config()
+    sock, supervisor = prefork(port, config.WORKERS, host='127.0.0.1')
+    # Stop the other workers with the supervisor
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info(f"Starting API worker {worker_index()} on port {port}...")
+    server = make_server('127.0.0.1', port, app, threaded=True, fd=sock.fileno())
+    try:
+        server.serve_forever()
+    finally:
+        if supervisor is not None:
+            supervisor.stop()
+
 if __name__ == '__main__':
     try:
         port = 5000
-        logger.info(f"Starting API service on port {port}...")
-        app.run(host='127.0.0.1', port=port, debug=True)
+        if config.WORKERS > 1:
+            serve_workers(port)
+        else:
+            logger.info(f"Starting API service on port {port}...")
+            # No reloader: it would set up the services (suds clients, job queue) twice
+            make_server('127.0.0.1', port, app, threaded=True).serve_forever()
     except Exception as e:
-        logger.error(f"Failed to start server: {e}")
\ No newline at end of file
+        logger.error(f"Failed to start server: {e}")
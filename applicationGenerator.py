@@ -0,0 +1,121 @@
+# applicationGenerator.py
+"""
+Synthetic loan applications in the format of the data/announce*.txt samples.
+
+Each application is drawn from one of four borrower profiles mirroring
+the samples (rich, worst, below average, above average), with incomes,
+loan amounts and property sizes consistent with the profile. The same
+seed always gives the same applications.
+
+    python applicationGenerator.py 100000 --output archive.jsonl
+    python applicationGenerator.py 50 --directory inbox/
+
+The JSONL output holds {"id", "content"} lines, the input format of
+bulkProcess.py.
+"""
+
+import argparse
+import json
+import os
+import random
+
+FIRST_NAMES = ('Alexandre', 'Martin', 'Sophie', 'Philippe', 'Camille', 'Julie', 'Thomas',
+               'Nicolas', 'Claire', 'Léa', 'Hugo', 'Manon', 'Louis', 'Chloé', 'Antoine')
+LAST_NAMES = ('Dubois', 'Dupuis', 'Martin', 'Lambert', 'Bernard', 'Petit', 'Durand',
+              'Leroy', 'Moreau', 'Simon', 'Laurent', 'Lefèvre', 'Michel', 'Garcia', 'Roux')
+STREETS = ('Rue de la Paix', 'Avenue Victor Hugo', 'Rue des Lilas', 'Boulevard Voltaire',
+           'Avenue Montaigne', 'Rue de la République', 'Quai Saint-Antoine', 'Rue Mercière')
+CITIES = {
+    'Paris': [f"750{n:02d}" for n in range(1, 21)],
+    'Lyon': [f"6900{n}" for n in range(1, 10)],
+}
+
+# Description fragments by condition; the keywords match those of the
+# property evaluation service's virtual inspection
+CONDITIONS = {
+    'good': ("entièrement rénové", "moderne et lumineux", "construction récente", "neuf, jamais habité"),
+    'average': ("en état correct", "quelques rafraîchissements à prévoir", "bien entretenu"),
+    'poor': ("nécessitant des travaux importants", "ancien, humidité dans les murs", "à rénover entièrement"),
+}
+FEATURES = ("terrasse", "balcon", "parquet", "cheminée", "double vitrage", "ascenseur",
+            "cave", "parking", "cuisine équipée", "vue dégagée", "chauffage collectif")
+PROTECTED_AREAS = {'Paris': ('Marais', 'Montmartre'), 'Lyon': ('Vieux Lyon',)}
+
+# Borrower profiles: (weight, monthly income range, expense share range,
+# loan-to-income multiple range, size range, condition weights good/average/poor)
+PROFILES = {
+    'rich': (0.1, (20000, 50000), (0.15, 0.3), (60, 120), (150, 350), (0.7, 0.25, 0.05)),
+    'above_average': (0.3, (7000, 20000), (0.25, 0.45), (60, 120), (70, 150), (0.5, 0.4, 0.1)),
+    'below_average': (0.4, (2500, 7000), (0.45, 0.7), (80, 140), (35, 90), (0.2, 0.5, 0.3)),
+    'worst': (0.2, (1500, 3000), (0.7, 0.95), (100, 160), (12, 60), (0.05, 0.35, 0.6)),
+}
+
+
+def _amount(value, step=1000):
+    return int(round(value / step)) * step
+
+
+def generate_application(rng):
+    """One synthetic application text"""
+    profile = rng.choices(list(PROFILES), weights=[p[0] for p in PROFILES.values()])[0]
+    _, income_range, expense_share, loan_multiple, size_range, condition_weights = PROFILES[profile]
+
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    city = rng.choice(list(CITIES))
+    postcode = rng.choice(CITIES[city])
+
+    income = _amount(rng.uniform(*income_range), 100)
+    expenses = _amount(income * rng.uniform(*expense_share), 100)
+    loan = _amount(income * rng.uniform(*loan_multiple), 10000)
+    size = rng.randint(*size_range)
+
+    condition = rng.choices(list(CONDITIONS), weights=condition_weights)[0]
+    kind = "Maison" if size > 120 and rng.random() < 0.4 else "Appartement"
+    description = f"{kind} de {size}m² {rng.choice(CONDITIONS[condition])}."
+    description += " " + ", ".join(rng.sample(FEATURES, rng.randint(1, 4))).capitalize() + "."
+    bedrooms = max(1, size // 30)
+    description += f" {bedrooms} chambre{'s' if bedrooms > 1 else ''}."
+    if rng.random() < 0.03:
+        description += f" Situé dans le quartier {rng.choice(PROTECTED_AREAS[city])}."
+
+    return f"""Nom du Client: {first} {last}
+Adresse: {rng.randint(1, 120)} {rng.choice(STREETS)}, {postcode} {city}, France
+Email: {first.lower()}.{last.lower()}{rng.randint(1, 999999)}@email.com
+Numéro de Téléphone: +33 6 {' '.join(f'{rng.randint(0, 99):02d}' for _ in range(4))}
+Montant du Prêt Demandé: {loan} EUR
+Durée du Prêt: {rng.choice((15, 20, 25, 30))} ans
+Description de la Propriété: {description}
+Revenu Mensuel: {income} EUR
+Dépenses Mensuelles: {expenses} EUR"""
+
+
+def generate_applications(count, seed=0):
+    """Yield count synthetic application texts"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield generate_application(rng)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic loan applications")
+    parser.add_argument('count', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--output', help="JSONL file of {\"id\", \"content\"} lines")
+    target.add_argument('--directory', help="Directory to write one text file per application to")
+    args = parser.parse_args(argv)
+
+    applications = generate_applications(args.count, args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for i, text in enumerate(applications):
+                f.write(json.dumps({'id': f"synthetic_{i}", 'content': text}, ensure_ascii=False) + '\n')
+    else:
+        os.makedirs(args.directory, exist_ok=True)
+        for i, text in enumerate(applications):
+            with open(os.path.join(args.directory, f"synthetic_{i}.txt"), 'w', encoding='utf-8') as f:
+                f.write(text)
+
+
+if __name__ == '__main__':
+    main()
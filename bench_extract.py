@@ -0,0 +1,85 @@
+# bench_extract.py
+"""
+Micro-benchmark of the extraction service parser against the previous
+per-field regex implementation.
+
+    python bench_extract.py [--repeat N]
+
+Checks that both produce the same field map on the data/announce*.txt
+samples, then times them on the samples and on longer descriptions.
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import timeit
+
+from extractService import extract_fields
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def legacy_extract_fields(text):
+    """text_to_json as it was before the single-pass parser"""
+    patterns = {
+        'Nom du Client': r'Nom du Client:\s*(.*?)(?=\s*(Adresse|Email|Numéro de Téléphone|Montant du Prêt Demandé|Durée du Prêt|Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
+        'Adresse': r'Adresse:\s*(.*?)(?=\s*(Email|Numéro de Téléphone|Montant du Prêt Demandé|Durée du Prêt|Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
+        'Email': r'Email:\s*(.*?)(?=\s*(Numéro de Téléphone|Montant du Prêt Demandé|Durée du Prêt|Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
+        'Numéro de Téléphone': r'Numéro de Téléphone:\s*(.*?)(?=\s*(Montant du Prêt Demandé|Durée du Prêt|Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
+        'Montant du Prêt Demandé': r'Montant du Prêt Demandé:\s*(.*?)(?=\s*(Durée du Prêt|Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
+        'Durée du Prêt': r'Durée du Prêt:\s*(.*?)(?=\s*(Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
+        'Description de la Propriété': r'Description de la Propriété:\s*(.*?)(?=\s*(Revenu Mensuel|Dépenses Mensuelles):|$)',
+        'Revenu Mensuel': r'Revenu Mensuel:\s*(.*?)(?=\s*Dépenses Mensuelles:|$)',
+        'Dépenses Mensuelles': r'Dépenses Mensuelles:\s*(.*?)(?=\s*$)'
+    }
+    result = {}
+    for field, pattern in patterns.items():
+        match = re.search(pattern, text)
+        if match:
+            result[field] = match.group(1).strip()
+    return json.dumps(result, indent=4, ensure_ascii=False)
+
+
+def load_samples():
+    samples = {}
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, 'announce*.txt'))):
+        with open(path, encoding='utf-8') as f:
+            samples[os.path.basename(path)] = f.read()
+    return samples
+
+
+def lengthen(text, factor):
+    """Same application with a description factor times longer"""
+    def repeat(match):
+        return match.group(1) + ' '.join([match.group(2)] * factor)
+    return re.sub(r'(Description de la Propriété:\s*)(.*)', repeat, text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the extraction parser")
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    samples = load_samples()
+    for name, text in samples.items():
+        if extract_fields(text) != legacy_extract_fields(text):
+            raise SystemExit(f"Résultat différent pour {name}")
+    print(f"{len(samples)} échantillons: résultats identiques")
+
+    cases = dict(samples)
+    base = next(iter(samples.values()))
+    for factor in (10, 100):
+        cases[f"description x{factor}"] = lengthen(base, factor)
+
+    print(f"{'cas':<28}{'ancien (µs)':>14}{'nouveau (µs)':>14}{'gain':>8}")
+    for name, text in cases.items():
+        repeat = max(1, args.repeat // max(1, len(text) // 1000))
+        legacy = timeit.timeit(lambda: legacy_extract_fields(text), number=repeat) / repeat
+        current = timeit.timeit(lambda: extract_fields(text), number=repeat) / repeat
+        print(f"{name:<28}{legacy * 1e6:>14.1f}{current * 1e6:>14.1f}{legacy / current:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
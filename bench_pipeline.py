@@ -0,0 +1,194 @@
+# bench_pipeline.py
+"""
+Stage-level benchmarks of the loan pipeline.
+
+    python bench_pipeline.py --output bench_results.json
+    python bench_pipeline.py --baseline bench_baseline.json
+    python bench_pipeline.py --save-baseline bench_baseline.json
+
+Each benchmark times one stage over the data/announce*.txt samples plus
+--synthetic applications from applicationGenerator, with the inputs of
+the stage prepared beforehand. Every case is run --rounds times (each
+round lasting at least MIN_ROUND_TIME) and the fastest round is kept,
+which filters out most scheduling noise.
+
+Results are written as JSON (mean time per call in µs, and calls per
+round). With --baseline, each benchmark is compared against a previous
+result file: a mean more than --threshold slower is reported as a
+regression and the script exits with status 1.
+"""
+
+import argparse
+import json
+import logging
+import math
+import platform
+import sys
+import time
+
+from applicationGenerator import generate_applications
+from bench_extract import load_samples
+from checkSolvabService import assess_solvency
+from decisionService import RiskAnalysis
+from extractService import extract_fields
+from parsedApplication import ParsedApplication
+from propEvalService import property_evaluation_service
+from serviceComposite import ServiceComposite
+
+MIN_ROUND_TIME = 0.05
+
+
+def prepare(texts):
+    """Inputs of every benchmarked stage, one entry per application"""
+    service = ServiceComposite(concurrent=False, transport='local', storage='memory')
+    financial = service.financial_db.simulate_history
+    applications = [ParsedApplication.from_text(text) for text in texts]
+    histories = [financial() for _ in applications]
+    return {
+        'texts': texts,
+        'applications': applications,
+        'credit_checks': [
+            (a.monthly_income, a.monthly_expenses, h.value_debt, h.late_payments, h.has_bankruptcy)
+            for a, h in zip(applications, histories)
+        ],
+        'risk_inputs': [
+            (750, a.size_sqm * 8000, a.loan_amount, a.monthly_income or 1, a.monthly_expenses, 3,
+             {'late_payments': h.late_payments, 'has_bankruptcy': h.has_bankruptcy})
+            for a, h in zip(applications, histories)
+        ],
+    }
+
+
+def benchmarks(inputs):
+    """(name, function running the stage once per input) pairs"""
+    service = ServiceComposite(concurrent=False, transport='local', storage='memory')
+    property_service = property_evaluation_service()
+    texts = inputs['texts']
+    applications = inputs['applications']
+
+    def text_to_json():
+        for text in texts:
+            extract_fields(text)
+
+    def extract_property_info():
+        for text in texts:
+            service.extract_property_info(text)
+
+    def virtual_inspection():
+        for application in applications:
+            property_service._virtual_inspection(application.description)
+
+    def check_legal_compliance():
+        for application in applications:
+            property_service._check_legal_compliance(
+                application.location, application.size_sqm, application.description)
+
+    def credit_check():
+        for args in inputs['credit_checks']:
+            assess_solvency(*args)
+
+    def calculate_risk_score():
+        for args in inputs['risk_inputs']:
+            RiskAnalysis.calculate_risk_score(*args)
+
+    def process_and_store():
+        for i, application in enumerate(applications):
+            try:
+                service.process_and_store(f"bench_{i}", application)
+            except ValueError:
+                # Non compliant property, rejected like in production
+                pass
+
+    return [
+        ('text_to_json', text_to_json),
+        ('extract_property_info', extract_property_info),
+        ('_virtual_inspection', virtual_inspection),
+        ('_check_legal_compliance', check_legal_compliance),
+        ('credit_check', credit_check),
+        ('RiskAnalysis.calculate_risk_score', calculate_risk_score),
+        ('process_and_store', process_and_store),
+    ]
+
+
+def run(rounds, synthetic, seed):
+    texts = list(load_samples().values()) + list(generate_applications(synthetic, seed))
+    inputs = prepare(texts)
+    results = {}
+    for name, bench in benchmarks(inputs):
+        # The warm-up run also sets how many passes make a round last at
+        # least MIN_ROUND_TIME, so short stages are not timed on a single pass
+        passes = max(1, math.ceil(MIN_ROUND_TIME / max(_timed(bench, 1), 1e-9)))
+        best = min(_timed(bench, passes) for _ in range(rounds))
+        results[name] = {
+            'mean_us': best / (passes * len(texts)) * 1e6,
+            'calls': passes * len(texts),
+        }
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'rounds': rounds,
+        'synthetic': synthetic,
+        'seed': seed,
+        'results': results,
+    }
+
+
+def _timed(bench, passes):
+    start = time.perf_counter()
+    for _ in range(passes):
+        bench()
+    return time.perf_counter() - start
+
+
+def compare(current, baseline, threshold):
+    """Print the comparison table, return the names of the regressed benchmarks"""
+    regressions = []
+    print(f"{'benchmark':<36}{'base (µs)':>12}{'actuel (µs)':>13}{'ratio':>8}")
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f"{name:<36}{'-':>12}{result['mean_us']:>13.2f}{'nouveau':>8}")
+            continue
+        ratio = result['mean_us'] / base['mean_us']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  RÉGRESSION'
+        print(f"{name:<36}{base['mean_us']:>12.2f}{result['mean_us']:>13.2f}{ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the stages of the loan pipeline")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--synthetic', type=int, default=1000, help="Synthetic applications added to the samples")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="JSON file for the results")
+    parser.add_argument('--baseline', help="Previous results to compare against")
+    parser.add_argument('--save-baseline', help="Also write the results to this baseline file")
+    parser.add_argument('--threshold', type=float, default=0.20, help="Slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    # Per-request logging would dominate the timings
+    logging.disable(logging.CRITICAL)
+
+    current = run(args.rounds, args.synthetic, args.seed)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(current, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} régression(s): {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        for name, result in current['results'].items():
+            print(f"{name:<36}{result['mean_us']:>10.2f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+# bench_protocols.py
+"""
+Per-call cost of the SOAP protocol against the compact JSON and
+MessagePack protocols of the spyne services (see serviceRunner.py).
+
+    python bench_protocols.py [--batch-size 50] [--output protocols.json]
+
+Everything runs in-process, without network, so only protocol work is
+timed:
+
+- client: building the request and decoding the reply, with suds for
+  SOAP (as SoapTransport does) and with the encoder of JsonTransport /
+  MsgpackTransport for the compact protocols;
+- server: the spyne WSGI application handling the request, i.e. parsing,
+  validation (lxml schema for SOAP, soft type checks for the compact
+  protocols), the service method and serialization of the reply.
+
+The service method is the same for every protocol, so the differences
+between protocols are serialization and validation cost. Request and
+reply sizes are reported too.
+"""
+
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+
+from suds.client import Client
+from spyne.server.wsgi import WsgiApplication
+
+import checkSolvabService
+import decisionService
+import extractService
+import propEvalService
+from bench_extract import load_samples
+from parsedApplication import ParsedApplication
+from serviceRunner import compact_application
+from storage import FinancialDatabase
+from transports import JsonTransport, MsgpackTransport
+
+MIN_ROUND_TIME = 0.05
+PROTOCOLS = ('soap', 'json', 'msgpack')
+CONTENT_TYPES = {'soap': 'text/xml; charset=utf-8', 'json': JsonTransport.content_type,
+                 'msgpack': MsgpackTransport.content_type}
+CODECS = {'json': JsonTransport, 'msgpack': MsgpackTransport}
+
+
+def cases(batch_size):
+    """(case name, service module, method, arguments, item model of the batch argument)"""
+    text = next(iter(load_samples().values()))
+    application = ParsedApplication.from_text(text)
+    history = FinancialDatabase().get_financial_data('default_client')
+    credit = {
+        'monthly_income': application.monthly_income,
+        'monthly_expenses': application.monthly_expenses,
+        'outstanding_debt': history.value_debt,
+        'late_payments': history.late_payments,
+        'has_bankruptcy': history.has_bankruptcy,
+    }
+    decision = {
+        'credit_score': 750.0,
+        'property_value': application.size_sqm * 8000.0,
+        'loan_amount': float(application.loan_amount),
+        'monthly_income': float(application.monthly_income),
+        'monthly_expenses': float(application.monthly_expenses),
+        'stable_employment_years': 3,
+        'late_payments': history.late_payments,
+        'has_bankruptcy': history.has_bankruptcy,
+        'property_valuation': application.size_sqm * 8000.0,
+    }
+    return [
+        ('text_to_json', extractService, 'text_to_json', {'text': text}, None),
+        ('credit_check', checkSolvabService, 'credit_check', credit, None),
+        (f'credit_check_batch[{batch_size}]', checkSolvabService, 'credit_check_batch',
+         {'requests': [credit] * batch_size}, checkSolvabService.CreditCheckRequest),
+        ('evaluate_property', propEvalService, 'evaluate_property', application.property_info(), None),
+        ('evaluate_loan_application', decisionService, 'evaluate_loan_application', decision, None),
+        (f'evaluate_loan_application_batch[{batch_size}]', decisionService, 'evaluate_loan_application_batch',
+         {'applications': [decision] * batch_size}, decisionService.LoanApplication),
+    ]
+
+
+def wsgi_call(wsgi_app, body=b'', content_type='', query=''):
+    environ = {
+        'REQUEST_METHOD': 'POST' if body else 'GET', 'PATH_INFO': '/', 'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'wsgi.url_scheme': 'http',
+        'CONTENT_TYPE': content_type, 'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body),
+    }
+    status = []
+    reply = b''.join(wsgi_app(environ, lambda s, headers: status.append(s)))
+    if not status[0].startswith('200'):
+        raise RuntimeError(f"{status[0]}: {reply[:200]}")
+    return reply
+
+
+class SoapCodec:
+    """suds client that builds envelopes and parses replies without sending them"""
+
+    def __init__(self, wsgi_app, directory):
+        path = os.path.join(directory, f"{id(wsgi_app)}.wsdl")
+        with open(path, 'wb') as f:
+            f.write(wsgi_call(wsgi_app, query='wsdl'))
+        self.client = Client(f'file://{path}', nosend=True, cache=None)
+
+    def request(self, method, arguments, item_model):
+        if item_model:
+            (name, items), = arguments.items()
+            arguments = {name: self._to_array(item_model, items)}
+        return getattr(self.client.service, method)(**arguments)
+
+    def _to_array(self, item_model, items):
+        """SoapTransport._to_array with qualified type names: imported here,
+        the models live in the namespace of their module instead of __main__"""
+        type_name = item_model.get_type_name()
+        qualified = f"{{{item_model.__module__}}}{type_name}"
+        array = self.client.factory.create(f"{qualified}Array")
+        entries = []
+        for item in items:
+            entry = self.client.factory.create(qualified)
+            for key, value in item.items():
+                setattr(entry, key, value)
+            entries.append(entry)
+        setattr(array, type_name, entries)
+        return array
+
+    def encode(self, method, arguments, item_model):
+        return self.request(method, arguments, item_model).envelope
+
+    def roundtrip(self, method, arguments, item_model, reply):
+        return self.request(method, arguments, item_model).process_reply(reply)
+
+
+class CompactCodec:
+    def __init__(self, codec):
+        self.codec = codec
+
+    def encode(self, method, arguments, item_model):
+        return self.codec.encode({method: arguments})
+
+    def roundtrip(self, method, arguments, item_model, reply):
+        self.codec.encode({method: arguments})
+        return self.codec.decode(reply)
+
+
+def per_call(function, rounds):
+    """Best time of one call over rounds rounds of at least MIN_ROUND_TIME"""
+    start = time.perf_counter()
+    function()
+    calls = max(1, math.ceil(MIN_ROUND_TIME / max(time.perf_counter() - start, 1e-9)))
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return best / calls
+
+
+def run(batch_size, rounds):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        servers = {}
+        for name, module, method, arguments, item_model in cases(batch_size):
+            results[name] = {}
+            for protocol in PROTOCOLS:
+                key = (module.__name__, protocol)
+                if key not in servers:
+                    if protocol == 'soap':
+                        wsgi_app = WsgiApplication(module.application)
+                        servers[key] = (wsgi_app, SoapCodec(wsgi_app, directory))
+                    else:
+                        wsgi_app = WsgiApplication(compact_application(module.application, protocol))
+                        servers[key] = (wsgi_app, CompactCodec(CODECS[protocol]))
+                wsgi_app, codec = servers[key]
+
+                body = codec.encode(method, arguments, item_model)
+                reply = wsgi_call(wsgi_app, body, CONTENT_TYPES[protocol])
+                results[name][protocol] = {
+                    'client_us': per_call(lambda: codec.roundtrip(method, arguments, item_model, reply), rounds) * 1e6,
+                    'server_us': per_call(lambda: wsgi_call(wsgi_app, body, CONTENT_TYPES[protocol]), rounds) * 1e6,
+                    'request_bytes': len(body),
+                    'reply_bytes': len(reply),
+                }
+    return results
+
+
+def print_results(results):
+    print(f"{'appel':<38}{'protocole':<10}{'client (µs)':>12}{'serveur (µs)':>13}{'total':>10}"
+          f"{'vs soap':>9}{'requête (o)':>13}{'réponse (o)':>13}")
+    for name, by_protocol in results.items():
+        soap_total = by_protocol['soap']['client_us'] + by_protocol['soap']['server_us']
+        for protocol, r in by_protocol.items():
+            total = r['client_us'] + r['server_us']
+            print(f"{name:<38}{protocol:<10}{r['client_us']:>12.1f}{r['server_us']:>13.1f}{total:>10.1f}"
+                  f"{total / soap_total:>8.2f}x{r['request_bytes']:>13}{r['reply_bytes']:>13}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare SOAP and compact protocol cost per call")
+    parser.add_argument('--batch-size', type=int, default=50, help="Items per batch call")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--output', help="JSON file for the results")
+    args = parser.parse_args(argv)
+
+    # Per-request logging would dominate the timings
+    logging.disable(logging.CRITICAL)
+
+    results = run(args.batch_size, args.rounds)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
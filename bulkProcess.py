@@ -0,0 +1,229 @@
+# bulkProcess.py
+"""
+Offline bulk processing of loan application archives.
+
+Applications are sharded across a process pool. Each worker runs the
+extraction, property evaluation, solvency and decision logic in-process
+(local transport), so no service needs to be running. One JSON line per
+application is streamed to the output as chunks complete, with the same
+fields as the /process API response plus the application id.
+
+    python bulkProcess.py archive/ --output decisions.jsonl
+    python bulkProcess.py archive.jsonl --output decisions.jsonl --resume
+
+Input is either a directory of application text files (the id is the file
+name) or a JSONL file of {"id": ..., "content": ...} lines (the id
+defaults to the line number). With --resume, ids already present in the
+output are skipped and new results are appended.
+
+With the default memory storage, each worker drops the clients it has
+stored after every chunk, so its memory does not grow with the archive;
+--storage sqlite keeps them all in the database.
+
+A throughput and per-stage latency report is printed on stderr at the end.
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from logConfig import bind_request, setup_logging
+from parsedApplication import ParsedApplication
+from serviceComposite import ServiceComposite, STAGE_ORDER
+from storage import MemoryStorage
+
+REPORT_STAGES = ('extract',) + STAGE_ORDER
+
+# Worker process state, set up by _init_worker
+_service = None
+_timings = None
+
+
+def read_applications(path, pattern='*.txt'):
+    """Yield (id, text) pairs from a directory of text files or a JSONL file"""
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, name)
+            if fnmatch.fnmatch(name, pattern) and os.path.isfile(file_path):
+                with open(file_path, encoding='utf-8') as f:
+                    yield name, f.read()
+        return
+
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield str(record.get('id', f"line_{number}")), record['content']
+
+
+def read_done_ids(path):
+    """Ids already present in an output file, for --resume.
+
+    A last line left incomplete by an interrupted run is cut off, so that
+    new results start on a fresh line and that application is redone.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    complete = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            complete += len(line)
+            try:
+                done.add(json.loads(line)['id'])
+            except (ValueError, KeyError):
+                continue
+    if complete != os.path.getsize(path):
+        os.truncate(path, complete)
+    return done
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _init_worker(storage, log_level):
+    global _service, _timings
+    # Forked workers need their own log writer thread
+    setup_logging('bulk', log_level)
+    _service = ServiceComposite(concurrent=False, transport='local', storage=storage)
+    _timings = {}
+    _service.stage_observer = _timings.__setitem__
+
+
+def _process_one(application_id, text):
+    bind_request(application_id)
+    start = time.perf_counter()
+    application = ParsedApplication.from_text(text)
+    _timings['extract'] = time.perf_counter() - start
+    client_id = application.email or f"client_{application_id}"
+
+    try:
+        result = _service.process_and_store(client_id, application)
+        return {
+            'id': application_id,
+            'status': 'success',
+            'client_id': client_id,
+            'client_data': result['client_data'],
+            'property_evaluation': result['property_evaluation'],
+            'approval_decision': result['approval_decision']
+        }
+    except ValueError as ve:
+        return {
+            'id': application_id,
+            'status': 'error',
+            'client_id': client_id,
+            'message': 'Demande non valide',
+            'evaluation': str(ve)
+        }
+
+
+def process_chunk(chunk):
+    """Process a list of (id, text) pairs in a worker.
+
+    Returns (record, stage timings) pairs, one per application.
+    """
+    results = []
+    for application_id, text in chunk:
+        _timings.clear()
+        try:
+            record = _process_one(application_id, text)
+        except Exception as e:
+            record = {'id': application_id, 'status': 'error', 'message': str(e)}
+        results.append((record, dict(_timings)))
+    if isinstance(_service.storage, MemoryStorage):
+        # The results are in the output: nothing reads the stored clients again
+        _service.storage.clear()
+    return results
+
+
+def report(count, elapsed, stage_timings, statuses, output=sys.stderr):
+    throughput = count / elapsed if elapsed > 0 else 0.0
+    print(f"{count} demandes traitées en {elapsed:.1f}s ({throughput:.1f} demandes/s)", file=output)
+    print(", ".join(f"{status}: {n}" for status, n in sorted(statuses.items())), file=output)
+    print(f"{'étape':<14}{'moyenne (ms)':>14}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}", file=output)
+    for stage in REPORT_STAGES:
+        values = stage_timings.get(stage)
+        if not values:
+            continue
+        ms = np.asarray(values) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        print(f"{stage:<14}{ms.mean():>14.2f}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}", file=output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process an archive of loan applications offline")
+    parser.add_argument('input', help="Directory of application text files, or JSONL file")
+    parser.add_argument('--output', required=True, help="JSONL file for the decisions")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument('--chunk-size', type=int, default=64, help="Applications sent to a worker at once")
+    parser.add_argument('--pattern', default='*.txt', help="Names of the files to read from a directory")
+    parser.add_argument('--resume', action='store_true', help="Skip ids already in the output and append")
+    parser.add_argument('--storage', default='memory', help="Storage backend of the workers: memory (cleared after each chunk) or sqlite")
+    parser.add_argument('--log-level', default='WARNING', help="Log level of the workers")
+    args = parser.parse_args(argv)
+
+    setup_logging('bulk', args.log_level)
+
+    done = read_done_ids(args.output) if args.resume else set()
+    applications = ((application_id, text) for application_id, text in read_applications(args.input, args.pattern)
+                    if application_id not in done)
+    chunks = chunked(applications, args.chunk_size)
+
+    stage_timings = defaultdict(list)
+    statuses = defaultdict(int)
+    count = 0
+    start = time.perf_counter()
+
+    with open(args.output, 'a' if args.resume else 'w', encoding='utf-8') as output, \
+            ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                initargs=(args.storage, args.log_level)) as executor:
+        # Keep a couple of chunks queued per worker, so the archive is never
+        # fully loaded in memory
+        pending = set()
+        max_pending = 2 * args.workers
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    pending.add(executor.submit(process_chunk, chunk))
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                for record, timings in future.result():
+                    output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    statuses[record['status']] += 1
+                    for stage, seconds in timings.items():
+                        stage_timings[stage].append(seconds)
+                    count += 1
+            output.flush()
+
+    if done:
+        print(f"{len(done)} demandes déjà traitées ignorées", file=sys.stderr)
+    report(count, time.perf_counter() - start, stage_timings, statuses)
+
+
+if __name__ == '__main__':
+    main()
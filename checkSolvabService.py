@@ -1,27 +1,47 @@
-import logging
 import re
 import sys
-from spyne import Application, rpc, ServiceBase, \
+from spyne import Application, rpc, ServiceBase, ComplexModel, \
     Integer, AnyDict, Array, Boolean, Unicode
 from spyne.protocol.soap import Soap11
-from spyne.server.wsgi import WsgiApplication
-from spyne.util.wsgi_wrapper import run_twisted
+from serviceRunner import run_service
+
+
+class CreditCheckRequest(ComplexModel):
+    monthly_income = Integer
+    monthly_expenses = Integer
+    outstanding_debt = Integer
+    late_payments = Integer
+    has_bankruptcy = Boolean
+
+
+def assess_solvency(monthly_income, monthly_expenses, outstanding_debt, late_payments, has_bankruptcy):
+    # Calculate credit score based on conditions
+    score = 1000 - (outstanding_debt * 0.1) - (late_payments * 50)
+            
+    if has_bankruptcy:
+        score -= 200
+
+    solvency = "solvent" if score >= 700 and monthly_income > monthly_expenses else "not solvent"
+    return solvency
 
-logging.basicConfig(level=logging.DEBUG)
 
 class credit_check_service(ServiceBase):
 
     @rpc(Integer, Integer, Integer, Integer, Boolean, _returns=Unicode)
     def credit_check(ctx, monthly_income, monthly_expenses, outstanding_debt, late_payments, has_bankruptcy):
-                
-        # Calculate credit score based on conditions
-        score = 1000 - (outstanding_debt * 0.1) - (late_payments * 50)
-                
-        if has_bankruptcy:
-            score -= 200
-    
-        solvency = "solvent" if score >= 700 and monthly_income > monthly_expenses else "not solvent"
-        return solvency
+        return assess_solvency(monthly_income, monthly_expenses, outstanding_debt,
+                               late_payments, has_bankruptcy)
+
+    @rpc(Array(CreditCheckRequest), _returns=Array(Unicode))
+    def credit_check_batch(ctx, requests):
+        """
+        Credit check for a whole batch of applicants, in request order.
+        """
+        return [
+            assess_solvency(r.monthly_income, r.monthly_expenses, r.outstanding_debt,
+                            r.late_payments, r.has_bankruptcy)
+            for r in requests or []
+        ]
 
 
 # Define the Spyne application
@@ -33,10 +53,4 @@ application = Application([credit_check_service],
 
 # Run the application
 if __name__ == '__main__':
-    wsgi_app = WsgiApplication(application)
-    
-    twisted_apps = [
-        (wsgi_app, b'credit_check_service'),
-    ]
-    
-    sys.exit(run_twisted(twisted_apps, 8001))
\ No newline at end of file
+    sys.exit(run_service(application, 'credit_check_service', 8001))
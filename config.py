@@ -0,0 +1,111 @@
+# config.py
+
+import os
+import tempfile
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+# Pipeline execution: run independent stages of process_and_store in parallel
+PIPELINE_CONCURRENT = env_bool('LOAN_PIPELINE_CONCURRENT', False)
+PIPELINE_MAX_WORKERS = env_int('LOAN_PIPELINE_MAX_WORKERS', 4)
+
+# Backend transport used by ServiceComposite: "soap" calls the spyne services
+# over HTTP, "json" and "msgpack" call their compact protocol endpoints,
+# "local" runs their logic in-process
+TRANSPORT = os.environ.get('LOAN_TRANSPORT', 'soap')
+
+SERVICE_WSDL_EXTRACT = os.environ.get(
+    'LOAN_WSDL_EXTRACT', 'http://localhost:8000/extract_information_service?wsdl')
+SERVICE_WSDL_SOLVENCY = os.environ.get(
+    'LOAN_WSDL_SOLVENCY', 'http://localhost:8001/credit_check_service?wsdl')
+SERVICE_WSDL_PROPERTY = os.environ.get(
+    'LOAN_WSDL_PROPERTY', 'http://localhost:8003/property_evaluation_service?wsdl')
+SERVICE_WSDL_APPROVAL = os.environ.get(
+    'LOAN_WSDL_APPROVAL', 'http://localhost:8004/approval_decision_service?wsdl')
+
+# suds client pool (soap transport): clients per service, created lazily up to
+# the pool size; LOAN_SUDS_POOL_WARMUP of them are created at startup
+SUDS_POOL_SIZE = env_int('LOAN_SUDS_POOL_SIZE', 8)
+SUDS_POOL_WARMUP = env_int('LOAN_SUDS_POOL_WARMUP', 0)
+
+# Time bounds on backend calls (see resilience.py): a request entering the
+# pipeline has LOAN_REQUEST_DEADLINE seconds (0: no deadline), each call at
+# most LOAN_SERVICE_TIMEOUT seconds, or the time of its service in
+# LOAN_SERVICE_TIMEOUTS "service=seconds,..." (e.g.
+# property_evaluation_service=2). After LOAN_BREAKER_FAILURES consecutive
+# failures a service is not called for LOAN_BREAKER_RESET seconds. With
+# LOAN_HEDGE_DELAY > 0, a credit check unanswered after that many seconds
+# is sent a second time
+REQUEST_DEADLINE = float(os.environ.get('LOAN_REQUEST_DEADLINE', 30))
+SERVICE_TIMEOUT = float(os.environ.get('LOAN_SERVICE_TIMEOUT', 10))
+SERVICE_TIMEOUTS = os.environ.get('LOAN_SERVICE_TIMEOUTS', '')
+BREAKER_FAILURES = env_int('LOAN_BREAKER_FAILURES', 5)
+BREAKER_RESET = float(os.environ.get('LOAN_BREAKER_RESET', 10))
+HEDGE_DELAY = float(os.environ.get('LOAN_HEDGE_DELAY', 0))
+
+# Parsed WSDLs are cached on disk so restarts skip fetching and parsing them
+WSDL_CACHE_DIR = os.environ.get('LOAN_WSDL_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'loan_wsdl_cache'))
+WSDL_CACHE_DAYS = env_int('LOAN_WSDL_CACHE_DAYS', 7)
+
+# Market data snapshot (see marketData.py) used by the property evaluation
+# service; without it only the built-in city table is available
+MARKET_DATA_PATH = os.environ.get('LOAN_MARKET_DATA')
+MARKET_DATA_CHECK_INTERVAL = float(os.environ.get('LOAN_MARKET_DATA_CHECK_INTERVAL', 5))
+
+# Lending policies of the decision service and the risk engine (see
+# institutionPolicies.py), reloaded when the file is replaced
+POLICIES_PATH = os.environ.get('LOAN_POLICIES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'policies.json'))
+POLICIES_CHECK_INTERVAL = float(os.environ.get('LOAN_POLICIES_CHECK_INTERVAL', 5))
+
+# Client and financial record storage (see storage.py): "memory" keeps them
+# in dicts, "sqlite" persists them in LOAN_SQLITE_PATH with an LRU of
+# LOAN_STORAGE_CACHE_SIZE records per table in front
+STORAGE = os.environ.get('LOAN_STORAGE', 'memory')
+SQLITE_PATH = os.environ.get('LOAN_SQLITE_PATH', 'loans.db')
+STORAGE_CACHE_SIZE = env_int('LOAN_STORAGE_CACHE_SIZE', 10000)
+
+# Asynchronous /process (see jobQueue.py): with LOAN_ASYNC_PROCESS, or per
+# request with a "Prefer: respond-async" header, /process answers 202 with a
+# job ID and LOAN_JOB_WORKERS threads run the queued jobs. At most
+# LOAN_JOB_QUEUE_SIZE jobs wait, beyond that requests are rejected with 503;
+# finished jobs can be polled on /jobs/<id> for LOAN_JOB_RETENTION seconds
+ASYNC_PROCESS = env_bool('LOAN_ASYNC_PROCESS', False)
+JOB_WORKERS = env_int('LOAN_JOB_WORKERS', 4)
+JOB_QUEUE_SIZE = env_int('LOAN_JOB_QUEUE_SIZE', 100)
+JOB_RETENTION = env_int('LOAN_JOB_RETENTION', 600)
+
+# /process result cache (see resultCache.py): results of the last
+# LOAN_RESULT_CACHE_SIZE distinct applications are served again for
+# LOAN_RESULT_CACHE_TTL seconds, and concurrent identical submissions share
+# one run. 0 for either disables the cache, not the coalescing
+RESULT_CACHE_SIZE = env_int('LOAN_RESULT_CACHE_SIZE', 1000)
+RESULT_CACHE_TTL = env_int('LOAN_RESULT_CACHE_TTL', 300)
+
+# Largest grid (loan amounts x down payments) a POST /what-if may ask for
+WHAT_IF_MAX_POINTS = env_int('LOAN_WHAT_IF_MAX_POINTS', 10000)
+
+# Logging (see logConfig.py): LOAN_LOG_LEVEL for the process, LOAN_LOG_LEVELS
+# "name=LEVEL,..." for single loggers or whole services; DEBUG records of the
+# suds/spyne payload loggers are kept at LOAN_LOG_SAMPLE_RATE. LOAN_LOG_TRACE
+# lets requests sent with "X-Debug-Trace: 1" be logged in full
+LOG_LEVEL = os.environ.get('LOAN_LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.environ.get('LOAN_LOG_LEVELS', '')
+LOG_FORMAT = os.environ.get('LOAN_LOG_FORMAT', 'text')
+LOG_SAMPLE_RATE = float(os.environ.get('LOAN_LOG_SAMPLE_RATE', 0.01))
+LOG_TRACE = env_bool('LOAN_LOG_TRACE', False)
+LOG_QUEUE_SIZE = env_int('LOAN_LOG_QUEUE_SIZE', 10000)
+
+# Processes serving each service or the API (see workers.py), set per
+# service by exec.py; several API workers need the sqlite storage
+WORKERS = env_int('LOAN_WORKERS', 1)
@@ -1,28 +1,10 @@
 import logging
 import sys
-from spyne import Application, rpc, ServiceBase, Unicode, Integer, Boolean, Float
+from spyne import Application, rpc, ServiceBase, ComplexModel, Unicode, Integer, Boolean, Float, Array
 from spyne.protocol.soap import Soap11
-from spyne.server.wsgi import WsgiApplication
-from spyne.util.wsgi_wrapper import run_twisted
+from serviceRunner import run_service
+from institutionPolicies import policy_store
 
-logging.basicConfig(level=logging.DEBUG)
-
-class InstitutionPolicies:
-    def __init__(self):
-        # Simulated institution policies
-        self.policies = {
-            'credit_score_minimum': 700,
-            'max_debt_to_income_ratio': 0.45,  # 45% maximum
-            'min_stable_employment_years': 2,
-            'max_loan_to_value_ratio': 0.85,  # 85% maximum
-            'min_credit_history_years': 3,
-            'interest_rates': {
-                'excellent': 0.029,  # 2.9%
-                'good': 0.034,      # 3.4%
-                'average': 0.039,   # 3.9%
-                'poor': 0.045       # 4.5%
-            }
-        }
 
 class RiskAnalysis:
     @staticmethod
@@ -87,25 +69,47 @@ class PredictionModel:
             logging.error(f"Error predicting default probability: {e}")
             return 1.0  # Return highest risk on error
 
+class LoanApplication(ComplexModel):
+    credit_score = Float
+    property_value = Float
+    loan_amount = Float
+    monthly_income = Float
+    monthly_expenses = Float
+    stable_employment_years = Integer
+    late_payments = Integer
+    has_bankruptcy = Boolean
+    property_valuation = Float
+
+
+class LoanDecision(ComplexModel):
+    approved = Boolean
+    risk_score = Float
+    default_probability = Float
+    interest_rate = Float
+    approved_amount = Float
+    reasons = Array(Unicode)
+    error = Unicode
+    # Version of the institution policies the decision was made with
+    policy_version = Unicode
+
+
 class approval_decision_service(ServiceBase):
     def __init__(self):
         super(approval_decision_service, self).__init__()
-        self.policies = InstitutionPolicies()
+        # Shared by every instance, reloaded when the policy file changes
+        self.policies = policy_store()
         self.risk_analyzer = RiskAnalysis()
         self.prediction_model = PredictionModel()
 
-    @rpc(Float, Float, Float, Float, Float, Integer, Integer, Boolean, 
-         Float, _returns=Unicode)
-    def evaluate_loan_application(ctx, credit_score, property_value, loan_amount,
-                                monthly_income, monthly_expenses, stable_employment_years,
-                                late_payments, has_bankruptcy, property_valuation):
+    def _evaluate(self, credit_score, property_value, loan_amount,
+                  monthly_income, monthly_expenses, stable_employment_years,
+                  late_payments, has_bankruptcy, property_valuation):
         """
         Evaluate a loan application and make an approval decision
         """
+        # One policy version for the whole decision, even if a reload happens meanwhile
+        policies = self.policies.current()
         try:
-            service = approval_decision_service()
-            policies = service.policies.policies
-            
             # 1. Risk Analysis
             payment_history = {
                 'late_payments': late_payments,
@@ -122,15 +126,12 @@ class approval_decision_service(ServiceBase):
             debt_to_income = monthly_expenses / monthly_income
             loan_to_value = loan_amount / property_value
             
-            policy_violations = []
-            if credit_score < policies['credit_score_minimum']:
-                policy_violations.append("Score de crédit insuffisant")
-            if debt_to_income > policies['max_debt_to_income_ratio']:
-                policy_violations.append("Ratio dette/revenu trop élevé")
-            if loan_to_value > policies['max_loan_to_value_ratio']:
-                policy_violations.append("Ratio prêt/valeur trop élevé")
-            if stable_employment_years < policies['min_stable_employment_years']:
-                policy_violations.append("Stabilité d'emploi insuffisante")
+            policy_violations = policies.violations({
+                'credit_score': credit_score,
+                'debt_to_income': debt_to_income,
+                'loan_to_value': loan_to_value,
+                'stable_employment_years': stable_employment_years,
+            })
             
             # 3. Prediction Model
             default_probability = PredictionModel.predict_default_probability(
@@ -139,41 +140,62 @@ class approval_decision_service(ServiceBase):
             )
             
             # 4. Make Decision
-            is_approved = len(policy_violations) == 0 and default_probability < 0.3
+            is_approved = len(policy_violations) == 0 and default_probability < policies.max_default_probability
             
             # 5. Determine Loan Terms if approved
             if is_approved:
                 # Determine interest rate based on risk score
-                if risk_score >= 80:
-                    interest_rate = policies['interest_rates']['excellent']
-                elif risk_score >= 70:
-                    interest_rate = policies['interest_rates']['good']
-                elif risk_score >= 60:
-                    interest_rate = policies['interest_rates']['average']
-                else:
-                    interest_rate = policies['interest_rates']['poor']
+                _, interest_rate = policies.rate_tier(risk_score)
                 
-                return f"""DÉCISION: APPROUVÉ
-Score de Risque: {risk_score:.1f}/100
-Probabilité de Défaut: {default_probability:.1%}
-Taux d'Intérêt Proposé: {interest_rate:.1%}
-Montant Approuvé: {loan_amount:,.2f} EUR"""
+                return LoanDecision(
+                    approved=True,
+                    risk_score=risk_score,
+                    default_probability=default_probability,
+                    interest_rate=interest_rate,
+                    approved_amount=loan_amount,
+                    reasons=[],
+                    policy_version=policies.version
+                )
             
             else:
-                reasons = '\n'.join(f"- {v}" for v in policy_violations)
-                return f"""DÉCISION: REFUSÉ
-Score de Risque: {risk_score:.1f}/100
-Probabilité de Défaut: {default_probability:.1%}
-Raisons:
-{reasons}
-Recommandations:
-- Améliorer le score de crédit
-- Réduire le ratio dette/revenu
-- Augmenter la période d'emploi stable"""
+                return LoanDecision(
+                    approved=False,
+                    risk_score=risk_score,
+                    default_probability=default_probability,
+                    reasons=policy_violations,
+                    policy_version=policies.version
+                )
 
         except Exception as e:
             logging.error(f"Evaluation error: {e}")
-            return "ERREUR: Impossible d'évaluer la demande de prêt"
+            return LoanDecision(error="Impossible d'évaluer la demande de prêt", policy_version=policies.version)
+
+    @rpc(Float, Float, Float, Float, Float, Integer, Integer, Boolean, 
+         Float, _returns=LoanDecision)
+    def evaluate_loan_application(ctx, credit_score, property_value, loan_amount,
+                                monthly_income, monthly_expenses, stable_employment_years,
+                                late_payments, has_bankruptcy, property_valuation):
+        """
+        Evaluate a loan application and make an approval decision
+        """
+        return decision_engine._evaluate(credit_score, property_value, loan_amount,
+                                         monthly_income, monthly_expenses, stable_employment_years,
+                                         late_payments, has_bankruptcy, property_valuation)
+
+    @rpc(Array(LoanApplication), _returns=Array(LoanDecision))
+    def evaluate_loan_application_batch(ctx, applications):
+        """
+        Evaluate a batch of loan applications in one pass, in request order.
+        """
+        return [
+            decision_engine._evaluate(a.credit_score, a.property_value, a.loan_amount,
+                                      a.monthly_income, a.monthly_expenses, a.stable_employment_years,
+                                      a.late_payments, a.has_bankruptcy, a.property_valuation)
+            for a in applications or []
+        ]
+
+# Evaluates every request, built once: the policies it holds reload themselves
+decision_engine = approval_decision_service()
 
 application = Application([approval_decision_service],
                         tns='spyne.examples.approval_decision',
@@ -181,10 +203,4 @@ application = Application([approval_decision_service],
                         out_protocol=Soap11())
 
 if __name__ == '__main__':
-    wsgi_app = WsgiApplication(application)
-    
-    twisted_apps = [
-        (wsgi_app, b'approval_decision_service'),
-    ]
-    
-    sys.exit(run_twisted(twisted_apps, 8004))
\ No newline at end of file
+    sys.exit(run_service(application, 'approval_decision_service', 8004))
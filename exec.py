@@ -1,32 +1,153 @@
+import argparse
+import os
+import signal
 import subprocess
 import time
 import sys
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
-SERVICES = [
-    ('Service extraction', 'extractService.py'),
-    ('Service Solvabilité', 'checkSolvabService.py'),
-    ('Service Estimation', 'propEvalService.py'),
-    ('Service Décision', 'decisionService.py'),
-    ('Service API', 'api_service.py')
+# (name, script, port); every service answers readiness probes on /health
+BACKENDS = [
+    ('Service extraction', 'extractService.py', 8000),
+    ('Service Solvabilité', 'checkSolvabService.py', 8001),
+    ('Service Estimation', 'propEvalService.py', 8003),
+    ('Service Décision', 'decisionService.py', 8004),
 ]
+API = ('Service API', 'api_service.py', 5000)
 
-def start_services():
+SERVICES = BACKENDS + [API]
+
+STARTUP_TIMEOUT = 30
+
+
+def is_ready(port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def wait_ready(name, port, process, started, timeout=STARTUP_TIMEOUT):
+    """Poll the service health endpoint with backoff, return its startup time"""
+    delay = 0.02
+    while not is_ready(port):
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} s'est arrêté au démarrage (code {process.returncode})")
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"{name} n'est pas prêt après {timeout}s")
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+    return time.perf_counter() - started
+
+
+def parse_workers(values):
+    """{script: worker count} from --workers values: "N" for every service,
+    "script=N" for one (e.g. propEvalService=4)"""
+    counts = {}
+    default = 1
+    for value in values or ():
+        name, _, count = value.rpartition('=')
+        if name:
+            script = name if name.endswith('.py') else f"{name}.py"
+            if script not in (file for _, file, _ in SERVICES):
+                raise ValueError(f"Service inconnu: {name}")
+            counts[script] = int(count)
+        else:
+            default = int(count)
+    return {file: counts.get(file, default) for _, file, _ in SERVICES}
+
+
+def launch(name, file, port, output=None, workers=1):
+    print(f"Starting {name}..." + (f" ({workers} workers)" if workers > 1 else ""))
+    # Own process group, so stop_stack also reaches children such as the
+    # Flask reloader or the other workers
+    process = subprocess.Popen([sys.executable, file], stdout=output, stderr=output,
+                               env=dict(os.environ, LOAN_WORKERS=str(workers)),
+                               start_new_session=(os.name == 'posix'))
+    return process, time.perf_counter()
+
+
+def stop_stack(processes):
+    for process in processes:
+        if process.poll() is not None:
+            continue
+        if os.name == 'posix':
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        else:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def start_stack(output=None, workers=None):
+    """Start the backends, then the API once they all answer.
+
+    workers maps scripts to their number of worker processes (see
+    parse_workers), one by default. Returns the processes and the startup
+    time of each service, in SERVICES order. On failure every started
+    process is stopped and the RuntimeError or TimeoutError is raised.
+    """
+    workers = workers or {}
     processes = []
-    for name, file in SERVICES:
-        print(f"Starting {name}...")
-        process = subprocess.Popen([sys.executable, file])
+    try:
+        # Backends do not depend on each other: start them all at once
+        launched = [launch(*service, output=output, workers=workers.get(service[1], 1))
+                    for service in BACKENDS]
+        processes.extend(process for process, _ in launched)
+        with ThreadPoolExecutor(max_workers=len(BACKENDS)) as pool:
+            startup_times = list(pool.map(
+                lambda args: wait_ready(args[0][0], args[0][2], *args[1]),
+                zip(BACKENDS, launched)
+            ))
+
+        # The API only starts once every backend answers
+        process, started = launch(*API, output=output, workers=workers.get(API[1], 1))
         processes.append(process)
-        time.sleep(3) 
-    
-    print("Tout les services sont en exécution. Ctrl+C pour arrêter.")
+        startup_times.append(wait_ready(API[0], API[2], process, started))
+
+    except (RuntimeError, TimeoutError):
+        stop_stack(processes)
+        raise
+
+    return processes, startup_times
+
+
+def start_services(argv=None):
+    parser = argparse.ArgumentParser(description="Start the backend services and the API")
+    parser.add_argument('--workers', action='append', metavar='[SERVICE=]N',
+                        help="Worker processes of every service (N) or of one (e.g. propEvalService=4); "
+                             "repeatable. Several API workers need LOAN_STORAGE=sqlite")
+    args = parser.parse_args(argv)
+    try:
+        workers = parse_workers(args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    try:
+        processes, startup_times = start_stack(workers=workers)
+    except (RuntimeError, TimeoutError) as e:
+        print(f"Échec du démarrage: {e}")
+        sys.exit(1)
+
+    for (name, _, port), elapsed in zip(SERVICES, startup_times):
+        print(f"  {name} (port {port}) prêt en {elapsed:.2f}s")
+    print(f"Tout les services sont en exécution en {time.perf_counter() - start:.2f}s. Ctrl+C pour arrêter.")
     
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
         print("\nArrêt des services...")
-        for process in processes:
-            process.terminate()
+        stop_stack(processes)
 
 if __name__ == '__main__':
-    start_services()
\ No newline at end of file
+    start_services()
@@ -1,45 +1,64 @@
-import logging
 import json
 import re
-
-logging.basicConfig(level=logging.DEBUG)
-
 import sys
 from spyne import Application, rpc, ServiceBase, \
-    Integer, Unicode
+    Integer, Unicode, Array
 from spyne.protocol.soap import Soap11
-from spyne.server.wsgi import WsgiApplication
-from spyne.util.wsgi_wrapper import run_twisted
+from serviceRunner import run_service
+
+# Application field labels, in the order fields are reported
+FIELD_LABELS = (
+    'Nom du Client',
+    'Adresse',
+    'Email',
+    'Numéro de Téléphone',
+    'Montant du Prêt Demandé',
+    'Durée du Prêt',
+    'Description de la Propriété',
+    'Revenu Mensuel',
+    'Dépenses Mensuelles',
+)
+
+# Matches any field label; longest labels first so none is cut short
+FIELD_LABEL_RE = re.compile(
+    '(' + '|'.join(re.escape(label) for label in sorted(FIELD_LABELS, key=len, reverse=True)) + '):'
+)
+
+
+def parse_fields(text):
+    """
+    Split an application on its field labels in a single scan.
+
+    Each field runs from its label to the next label (or the end of the
+    text), so values may span several lines. When a label appears twice
+    the first occurrence wins.
+    """
+    found = {}
+    matches = list(FIELD_LABEL_RE.finditer(text))
+    for match, following in zip(matches, matches[1:] + [None]):
+        label = match.group(1)
+        if label not in found:
+            end = following.start() if following else len(text)
+            found[label] = text[match.end():end].strip()
+    return {label: found[label] for label in FIELD_LABELS if label in found}
+
+
+def extract_fields(text):
+    # Convert the fields to JSON format
+    return json.dumps(parse_fields(text), indent=4, ensure_ascii=False)
+
 
 class extract_information_service(ServiceBase):
     @rpc(Unicode, _returns=Unicode)
     def text_to_json(ctx, text):
-        # Define regex patterns for each field
-        patterns = {
-            'Nom du Client': r'Nom du Client:\s*(.*?)(?=\s*(Adresse|Email|Numéro de Téléphone|Montant du Prêt Demandé|Durée du Prêt|Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
-            'Adresse': r'Adresse:\s*(.*?)(?=\s*(Email|Numéro de Téléphone|Montant du Prêt Demandé|Durée du Prêt|Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
-            'Email': r'Email:\s*(.*?)(?=\s*(Numéro de Téléphone|Montant du Prêt Demandé|Durée du Prêt|Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
-            'Numéro de Téléphone': r'Numéro de Téléphone:\s*(.*?)(?=\s*(Montant du Prêt Demandé|Durée du Prêt|Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
-            'Montant du Prêt Demandé': r'Montant du Prêt Demandé:\s*(.*?)(?=\s*(Durée du Prêt|Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
-            'Durée du Prêt': r'Durée du Prêt:\s*(.*?)(?=\s*(Description de la Propriété|Revenu Mensuel|Dépenses Mensuelles):|$)',
-            'Description de la Propriété': r'Description de la Propriété:\s*(.*?)(?=\s*(Revenu Mensuel|Dépenses Mensuelles):|$)',
-            'Revenu Mensuel': r'Revenu Mensuel:\s*(.*?)(?=\s*Dépenses Mensuelles:|$)',
-            'Dépenses Mensuelles': r'Dépenses Mensuelles:\s*(.*?)(?=\s*$)'
-        }
-        
-
-        # Create a dictionary to store the results
-        result = {}
-
-        # Search each field in the text using regex
-        for field, pattern in patterns.items():
-            match = re.search(pattern, text)
-            if match:
-                result[field] = match.group(1).strip()
-
-        # Convert the dictionary to JSON format
-        json_result = json.dumps(result, indent=4, ensure_ascii=False)
-        return json_result
+        return extract_fields(text)
+
+    @rpc(Array(Unicode), _returns=Array(Unicode))
+    def text_to_json_batch(ctx, texts):
+        """
+        Extract the fields of several applications in one call, in request order.
+        """
+        return [extract_fields(text) for text in texts or []]
 
             
 application = Application([extract_information_service],
@@ -49,15 +68,4 @@ application = Application([extract_information_service],
 )
 
 if __name__ == '__main__':
-    
-    wsgi_app = WsgiApplication(application)
-    
-    twisted_apps = [
-        (wsgi_app, b'extract_information_service'),
-    ]
-    
-    sys.exit(run_twisted(twisted_apps, 8000))
-
-    
-    
-    
\ No newline at end of file
+    sys.exit(run_service(application, 'extract_information_service', 8000))
@@ -0,0 +1,233 @@
+# ingestDaemon.py
+"""
+Watched-folder ingestion of loan application files.
+
+Watches a directory for application text files (same format as the
+data/announce*.txt samples) and runs each new file through
+ServiceComposite.process_and_store on a bounded worker pool. One JSON
+line per file is appended to the output as soon as it is processed, with
+the same fields as the /process API response plus the file name.
+
+    python ingestDaemon.py inbox/ --output results.jsonl
+
+Files already in the folder at startup are processed first. Processed
+files, and files rejected as invalid, are moved to a processed/
+subfolder, so a restart picks up where the previous run stopped. A file
+that fails for any other reason (backend unavailable or too slow) stays
+in the folder and is tried again by the next scan, every
+--rescan-interval seconds. When every worker is busy and the queue is
+full, new files wait in the folder until a slot frees up.
+"""
+
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import shutil
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from logConfig import bind_request, setup_logging
+from parsedApplication import ParsedApplication
+from serviceComposite import ServiceComposite
+
+logger = logging.getLogger(__name__)
+
+
+class JsonlWriter:
+    """Appends one JSON record per line, safe to share between workers"""
+
+    def __init__(self, path):
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class IngestionDaemon:
+    """
+    Feeds application files to process_and_store on a bounded worker pool.
+
+    At most workers + queue_size files are in flight. submit() blocks once
+    that limit is reached, which holds the watcher back until a worker is
+    done instead of buffering an unbounded backlog in memory.
+    """
+
+    def __init__(self, service, folder, writer, workers=4, queue_size=16,
+                 pattern='*.txt', settle_time=0.5):
+        self.service = service
+        self.folder = folder
+        self.writer = writer
+        self.pattern = pattern
+        self.settle_time = settle_time
+        self.processed_dir = os.path.join(folder, 'processed')
+        os.makedirs(self.processed_dir, exist_ok=True)
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def accepts(self, path):
+        return (os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.folder)
+                and fnmatch.fnmatch(os.path.basename(path), self.pattern))
+
+    def submit(self, path):
+        """Queue a file, blocking while the pool is saturated"""
+        if not self.accepts(path):
+            return
+        with self._lock:
+            if path in self._in_flight:
+                return
+            self._in_flight.add(path)
+        self._slots.acquire()
+        try:
+            self.executor.submit(self._process_file, path)
+        except BaseException:
+            self._release(path)
+            raise
+
+    def _release(self, path):
+        with self._lock:
+            self._in_flight.discard(path)
+        self._slots.release()
+
+    def scan(self):
+        """Queue the files already in the folder"""
+        for name in sorted(os.listdir(self.folder)):
+            path = os.path.join(self.folder, name)
+            if os.path.isfile(path):
+                self.submit(path)
+
+    def _wait_until_written(self, path):
+        """Wait until the file size stops changing, for writers still copying it"""
+        size = -1
+        while True:
+            current = os.path.getsize(path)
+            if current == size:
+                return
+            size = current
+            time.sleep(self.settle_time)
+
+    def _process_file(self, path):
+        name = os.path.basename(path)
+        bind_request(name)
+        try:
+            self._wait_until_written(path)
+            with open(path, encoding='utf-8') as f:
+                application = ParsedApplication.from_text(f.read())
+            client_id = application.email or f"client_{os.path.splitext(name)[0]}"
+
+            try:
+                result = self.service.process_and_store(client_id, application)
+                record = {
+                    'file': name,
+                    'status': 'success',
+                    'client_id': client_id,
+                    'client_data': result['client_data'],
+                    'property_evaluation': result['property_evaluation'],
+                    'approval_decision': result['approval_decision']
+                }
+            except ValueError as ve:
+                record = {
+                    'file': name,
+                    'status': 'error',
+                    'client_id': client_id,
+                    'message': 'Demande non valide',
+                    'evaluation': str(ve)
+                }
+        except FileNotFoundError:
+            # Moved away or already handled by another daemon
+            self._release(path)
+            return
+        except ValueError as e:
+            # Not an application text (e.g. not UTF-8): retrying will not help
+            logger.error(f"Invalid application file {name}: {e}")
+            record = {'file': name, 'status': 'error', 'message': str(e)}
+        except Exception as e:
+            # Transient failure: left in the folder for the next scan
+            logger.warning(f"Failed to process {name}, will retry: {e}")
+            self._release(path)
+            return
+
+        try:
+            self.writer.write(record)
+            shutil.move(path, os.path.join(self.processed_dir, name))
+        except Exception as e:
+            logger.error(f"Failed to record result for {name}: {e}")
+        finally:
+            self._release(path)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class ApplicationFileHandler(FileSystemEventHandler):
+    """Hands new or moved-in files over to the daemon"""
+
+    def __init__(self, daemon):
+        self.daemon = daemon
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.daemon.submit(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.daemon.submit(event.dest_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process loan application files dropped in a folder")
+    parser.add_argument('folder', help="Folder watched for application files")
+    parser.add_argument('--output', default='results.jsonl', help="JSONL file the results are appended to")
+    parser.add_argument('--workers', type=int, default=4, help="Files processed in parallel")
+    parser.add_argument('--queue-size', type=int, default=16, help="Files waiting for a worker before the watcher blocks")
+    parser.add_argument('--pattern', default='*.txt', help="Names of the files to process")
+    parser.add_argument('--rescan-interval', type=float, default=30,
+                        help="Seconds between scans of the folder for files to retry")
+    args = parser.parse_args(argv)
+
+    setup_logging('ingest')
+    writer = JsonlWriter(args.output)
+    daemon = IngestionDaemon(ServiceComposite(), args.folder, writer, workers=args.workers,
+                             queue_size=args.queue_size, pattern=args.pattern)
+
+    observer = Observer()
+    observer.schedule(ApplicationFileHandler(daemon), args.folder, recursive=False)
+    observer.start()
+    # Stop watching on SIGTERM, then finish the files already queued
+    signal.signal(signal.SIGTERM, lambda signum, frame: observer.stop())
+    logger.info(f"Watching {args.folder} for application files, results in {args.output}")
+    try:
+        daemon.scan()
+        last_scan = time.monotonic()
+        while observer.is_alive():
+            observer.join(1)
+            if time.monotonic() - last_scan >= args.rescan_interval:
+                daemon.scan()
+                last_scan = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        observer.stop()
+        observer.join()
+        daemon.shutdown()
+        writer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+# institutionPolicies.py
+"""
+Lending policies of the institution, shared by the decision service and
+the vectorized risk engine (riskEngine.py).
+
+Policies are read from a JSON file (LOAN_POLICIES, policies.json next to
+this module by default) and compiled once into a CompiledPolicies: the
+threshold rules with their comparison and limit resolved, and the rate
+tiers sorted. Decisions only evaluate the compiled rules, with no
+per-request setup.
+
+The file is checked at most every LOAN_POLICIES_CHECK_INTERVAL seconds
+and recompiled when it has been replaced. The new policies are swapped in
+as a whole, so a decision always sees a single version; a file that does
+not load or validate is logged and the previous policies stay in force.
+Every decision carries the version of the policies it was made with: the
+"version" of the file, or a hash of its content when it has none.
+
+    {
+        "version": "2024-06",
+        "credit_score_minimum": 700,
+        "max_debt_to_income_ratio": 0.45,
+        "max_loan_to_value_ratio": 0.85,
+        "min_stable_employment_years": 2,
+        "max_default_probability": 0.3,
+        "rate_tiers": [
+            {"tier": "excellent", "min_risk_score": 80, "interest_rate": 0.029},
+            ...
+            {"tier": "poor", "min_risk_score": null, "interest_rate": 0.045}
+        ]
+    }
+"""
+
+import hashlib
+import json
+import logging
+import operator
+import threading
+
+import config
+import metrics
+from reloadableFile import ReloadableFile
+
+POLICY_RELOADS = metrics.counter(
+    'loan_policy_reloads_total', "Policy file loads by result (loaded, failed)", ('result',))
+
+# Built-in policies, used when there is no policy file
+DEFAULT_POLICIES = {
+    'version': 'builtin',
+    'credit_score_minimum': 700,
+    'max_debt_to_income_ratio': 0.45,  # 45% maximum
+    'min_stable_employment_years': 2,
+    'max_loan_to_value_ratio': 0.85,  # 85% maximum
+    'min_credit_history_years': 3,
+    'max_default_probability': 0.3,
+    'rate_tiers': [
+        {'tier': 'excellent', 'min_risk_score': 80, 'interest_rate': 0.029},  # 2.9%
+        {'tier': 'good', 'min_risk_score': 70, 'interest_rate': 0.034},       # 3.4%
+        {'tier': 'average', 'min_risk_score': 60, 'interest_rate': 0.039},    # 3.9%
+        {'tier': 'poor', 'min_risk_score': None, 'interest_rate': 0.045},     # 4.5%
+    ],
+}
+
+# Threshold rules, in the order violations are reported:
+# (name, decision input, comparison that violates the policy, policy key, message)
+RULES = (
+    ('credit_score', 'credit_score', operator.lt, 'credit_score_minimum',
+     "Score de crédit insuffisant"),
+    ('debt_to_income', 'debt_to_income', operator.gt, 'max_debt_to_income_ratio',
+     "Ratio dette/revenu trop élevé"),
+    ('loan_to_value', 'loan_to_value', operator.gt, 'max_loan_to_value_ratio',
+     "Ratio prêt/valeur trop élevé"),
+    ('employment', 'stable_employment_years', operator.lt, 'min_stable_employment_years',
+     "Stabilité d'emploi insuffisante"),
+)
+
+
+class PolicyError(ValueError):
+    """Raised for a policy file that cannot be compiled"""
+
+
+class CompiledPolicies:
+    """
+    One version of the policies, ready to evaluate.
+
+    The rules and tiers work on scalars as well as on NumPy arrays, so the
+    decision service and the risk engine apply exactly the same policies.
+    """
+
+    def __init__(self, policies, version):
+        self.policies = policies
+        self.version = version
+        try:
+            self.rules = tuple(
+                (name, field, violates, float(policies[key]), message)
+                for name, field, violates, key, message in RULES
+            )
+            self.max_default_probability = float(policies['max_default_probability'])
+            tiers = [(str(t['tier']), t['min_risk_score'], float(t['interest_rate']))
+                     for t in policies['rate_tiers']]
+        except (KeyError, TypeError, ValueError) as e:
+            raise PolicyError(f"Invalid policies {version}: {e!r}") from None
+
+        thresholds = [threshold for _, threshold, _ in tiers]
+        if not tiers or thresholds[-1] is not None or None in thresholds[:-1]:
+            raise PolicyError(f"Invalid policies {version}: the last rate tier, and only it, "
+                              f"must have a null min_risk_score")
+        # Highest threshold first, so the first tier reached is the best one
+        self.rate_tiers = tuple(sorted(
+            ((tier, float(threshold), rate) for tier, threshold, rate in tiers[:-1]),
+            key=lambda t: t[1], reverse=True
+        )) + ((tiers[-1][0], None, tiers[-1][2]),)
+        self.interest_rates = {tier: rate for tier, _, rate in self.rate_tiers}
+
+    @classmethod
+    def from_json(cls, data):
+        """Compile the content of a policy file"""
+        try:
+            policies = json.loads(data)
+        except ValueError as e:
+            raise PolicyError(f"Invalid policy file: {e}") from None
+        if not isinstance(policies, dict):
+            raise PolicyError("Invalid policy file: not a JSON object")
+        version = policies.get('version') or hashlib.sha256(data).hexdigest()[:12]
+        return cls(policies, str(version))
+
+    def violations(self, values):
+        """Messages of the rules violated by values, a dict of decision inputs"""
+        return [message for _, field, violates, limit, message in self.rules
+                if violates(values[field], limit)]
+
+    def violation_masks(self, values):
+        """{rule name: violation mask} of arrays of decision inputs"""
+        return {name: violates(values[field], limit) for name, field, violates, limit, _ in self.rules}
+
+    def rate_tier(self, risk_score):
+        """(tier, interest rate) of an approved application"""
+        for tier, threshold, rate in self.rate_tiers:
+            if threshold is None or risk_score >= threshold:
+                return tier, rate
+
+
+class PolicyStore(ReloadableFile):
+    """
+    Current policies of the process, recompiled when the policy file is
+    replaced (see ReloadableFile). Decisions in progress keep the
+    CompiledPolicies they started with.
+    """
+
+    kind = 'Policies'
+
+    def __init__(self, path, check_interval=5.0):
+        super().__init__(path, check_interval, CompiledPolicies(DEFAULT_POLICIES, DEFAULT_POLICIES['version']))
+
+    def load(self):
+        with open(self.path, 'rb') as f:
+            return CompiledPolicies.from_json(f.read())
+
+    def loaded(self, policies):
+        POLICY_RELOADS.inc(result='loaded')
+        logging.info(f"Policies {policies.version} loaded from {self.path}")
+
+    def failed(self, error):
+        POLICY_RELOADS.inc(result='failed')
+        logging.error(f"Failed to load policies from {self.path}, keeping {self._value.version}: {error}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def policy_store():
+    """The PolicyStore of the process, on LOAN_POLICIES"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PolicyStore(config.POLICIES_PATH, config.POLICIES_CHECK_INTERVAL)
+        return _store
+
+
+def current_policies():
+    return policy_store().current()
@@ -0,0 +1,135 @@
+# jobQueue.py
+"""
+Bounded background job queue used by the API asynchronous mode.
+
+Jobs are queued in a fixed-size queue and run by a fixed pool of worker
+threads. When the queue is full, submit() raises QueueFull right away so
+the caller can turn the request away instead of letting latency grow
+without limit. Finished jobs are kept for a retention period so clients
+can poll for their result.
+"""
+
+import contextvars
+import logging
+import math
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import metrics
+
+JOBS = metrics.counter('loan_jobs_total', "Asynchronous jobs by state reached", ('state',))
+JOB_QUEUE_DEPTH = metrics.gauge('loan_job_queue_depth', "Jobs waiting for a worker")
+JOB_WAIT_SECONDS = metrics.histogram('loan_job_wait_seconds', "Time jobs spent queued before a worker took them")
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when no more work can be accepted"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Job:
+    __slots__ = ('id', 'state', 'args', 'context', 'result', 'error', 'submitted_at', 'started_at', 'finished_at')
+
+    def __init__(self, args):
+        self.id = uuid.uuid4().hex
+        self.state = 'queued'
+        self.args = args
+        # Run in the submitter's context, e.g. to keep its request ID in the logs
+        self.context = contextvars.copy_context()
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'state': self.state,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Runs handler(*args) for submitted jobs on worker threads.
+
+    States go queued -> running -> done (handler returned, result set) or
+    failed (handler raised, error set).
+    """
+
+    def __init__(self, handler, workers, max_queued, retention):
+        self.handler = handler
+        self.workers = workers
+        self.retention = retention
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        # Moving average of the job duration, for the Retry-After estimate
+        self._average_duration = 1.0
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, *args):
+        job = Job(args)
+        with self._lock:
+            self._prune()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                JOBS.inc(state='rejected')
+                raise QueueFull(self.retry_after()) from None
+            self._jobs[job.id] = job
+        JOBS.inc(state='queued')
+        JOB_QUEUE_DEPTH.set(self._queue.qsize())
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def retry_after(self):
+        """Seconds until the queue has likely drained enough to accept work"""
+        return max(1, math.ceil(self._queue.qsize() * self._average_duration / self.workers))
+
+    def _prune(self):
+        """Forget finished jobs older than the retention period"""
+        limit = time.time() - self.retention
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job.finished_at is not None and job.finished_at < limit:
+                del self._jobs[job_id]
+            elif job.finished_at is None:
+                # Jobs are in submission order: stop at the first unfinished one
+                break
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            JOB_QUEUE_DEPTH.set(self._queue.qsize())
+            job.started_at = time.time()
+            job.state = 'running'
+            JOB_WAIT_SECONDS.observe(job.started_at - job.submitted_at)
+            try:
+                job.result = job.context.run(self.handler, *job.args)
+                job.state = 'done'
+            except Exception as e:
+                logging.error(f"Job {job.id} failed: {e}")
+                job.error = str(e)
+                job.state = 'failed'
+            job.finished_at = time.time()
+            job.args = job.context = None
+            JOBS.inc(state=job.state)
+            self._average_duration = 0.9 * self._average_duration + 0.1 * (job.finished_at - job.started_at)
@@ -0,0 +1,243 @@
+# loadTest.py
+"""
+Open-loop load test of the API.
+
+Starts the local stack (see exec.py), then sends requests at a fixed
+average arrival rate with Poisson arrivals: a new request is issued on
+schedule whether or not earlier ones have completed, up to --concurrency
+requests in flight, and latency is measured from the scheduled arrival
+time. Queueing in front of a saturated component therefore shows up in
+the latencies instead of silently lowering the request rate.
+
+    python loadTest.py --rate 5,10,20,40 --duration 30
+
+Each rate in --rate is one step. A step mixes POST /process with
+synthetic applications (applicationGenerator) and GET /credit-check/<id>
+on clients processed earlier. For each endpoint it reports throughput,
+error rate and p50/p95/p99/p999 latency. It also breaks down the time
+spent in each downstream service, from the Server-Timing header of the
+API responses.
+"""
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from applicationGenerator import generate_application
+
+# Pipeline stage reported in Server-Timing -> component that runs it
+STAGE_COMPONENTS = {
+    'property': 'Service Estimation',
+    'credit_check': 'Service Solvabilité',
+    'store': 'Stockage',
+    'decision': 'Service Décision',
+}
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+def parse_server_timing(header):
+    """{metric: duration in ms} from a Server-Timing header"""
+    timings = {}
+    for entry in (header or '').split(','):
+        name, _, params = entry.strip().partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'dur' and name:
+                timings[name] = float(value)
+    return timings
+
+
+class Result:
+    __slots__ = ('endpoint', 'outcome', 'latency', 'timings')
+
+    def __init__(self, endpoint, outcome, latency, timings):
+        self.endpoint = endpoint
+        self.outcome = outcome  # 'ok', 'rejected' (invalid application) or 'error'
+        self.latency = latency
+        self.timings = timings
+
+
+class LoadGenerator:
+    def __init__(self, base_url, concurrency, credit_check_ratio, timeout, seed):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.credit_check_ratio = credit_check_ratio
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.client_ids = []
+        self._lock = threading.Lock()
+
+    def _request(self, path, body=None):
+        """(status, Server-Timing header, decoded JSON body or None)"""
+        data = None
+        headers = {}
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.headers.get('Server-Timing'), json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Server-Timing'), None
+
+    def process(self, text):
+        status, timing, body = self._request('/process', {'content': text})
+        if status == 200:
+            with self._lock:
+                self.client_ids.append(body['client_id'])
+            return 'ok', timing
+        return ('rejected' if status == 400 else 'error'), timing
+
+    def credit_check(self, client_id):
+        status, timing, _ = self._request(f"/credit-check/{urllib.request.quote(client_id)}")
+        return ('ok' if status == 200 else 'error'), timing
+
+    def _next_request(self):
+        """(endpoint, callable) of the next arrival, drawn in the dispatcher thread"""
+        with self._lock:
+            client_id = self.rng.choice(self.client_ids) if self.client_ids else None
+        if client_id and self.rng.random() < self.credit_check_ratio:
+            return 'credit-check', lambda: self.credit_check(client_id)
+        text = generate_application(self.rng)
+        return 'process', lambda: self.process(text)
+
+    def warm_up(self, count):
+        for _ in range(count):
+            self.process(generate_application(self.rng))
+
+    def run_step(self, rate, duration):
+        """Issue Poisson arrivals at rate requests/s for duration seconds"""
+        results = []
+        slots = threading.BoundedSemaphore(self.concurrency)
+
+        def execute(endpoint, call, scheduled):
+            try:
+                outcome, timing = call()
+            except Exception:
+                outcome, timing = 'error', None
+            finally:
+                slots.release()
+            results.append(Result(endpoint, outcome, time.perf_counter() - scheduled,
+                                  parse_server_timing(timing)))
+
+        start = time.perf_counter()
+        scheduled = start
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while True:
+                scheduled += self.rng.expovariate(rate)
+                if scheduled - start > duration:
+                    break
+                endpoint, call = self._next_request()
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                # Wait for a free client when all are busy; the wait counts
+                # in the latency since it is measured from the schedule
+                slots.acquire()
+                pool.submit(execute, endpoint, call, scheduled)
+        return results, time.perf_counter() - start
+
+
+def summarize(rate, results, elapsed):
+    summary = {'rate': rate, 'elapsed': elapsed, 'endpoints': {}, 'downstream': {}}
+    by_endpoint = defaultdict(list)
+    stage_timings = defaultdict(list)
+    for result in results:
+        by_endpoint[result.endpoint].append(result)
+        for stage, ms in result.timings.items():
+            stage_timings[stage].append(ms)
+
+    for endpoint, items in sorted(by_endpoint.items()):
+        latencies = np.array([r.latency for r in items]) * 1000
+        outcomes = defaultdict(int)
+        for r in items:
+            outcomes[r.outcome] += 1
+        summary['endpoints'][endpoint] = {
+            'requests': len(items),
+            'throughput': len(items) / elapsed,
+            'error_rate': outcomes['error'] / len(items),
+            'rejected': outcomes['rejected'],
+            'latency_ms': dict(zip((f"p{p:g}" for p in PERCENTILES), np.percentile(latencies, PERCENTILES))),
+        }
+    for stage, values in stage_timings.items():
+        summary['downstream'][stage] = {
+            'calls': len(values),
+            'latency_ms': dict(zip((f"p{p:g}" for p in PERCENTILES), np.percentile(values, PERCENTILES))),
+        }
+    return summary
+
+
+def print_summary(summary):
+    header = ''.join(f"{f'p{p:g} (ms)':>12}" for p in PERCENTILES)
+    print(f"\n=== {summary['rate']:g} req/s demandées, {summary['elapsed']:.1f}s ===")
+    print(f"{'endpoint':<16}{'requêtes':>10}{'req/s':>9}{'erreurs':>9}{'refusées':>10}{header}")
+    for endpoint, stats in summary['endpoints'].items():
+        latencies = ''.join(f"{value:>12.1f}" for value in stats['latency_ms'].values())
+        print(f"{endpoint:<16}{stats['requests']:>10}{stats['throughput']:>9.1f}"
+              f"{stats['error_rate']:>9.1%}{stats['rejected']:>10}{latencies}")
+    if summary['downstream']:
+        print(f"{'composant':<36}{'appels':>8}{header}")
+        for stage, stats in summary['downstream'].items():
+            name = f"{stage} ({STAGE_COMPONENTS.get(stage, '?')})"
+            latencies = ''.join(f"{value:>12.1f}" for value in stats['latency_ms'].values())
+            print(f"{name:<36}{stats['calls']:>8}{latencies}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Open-loop load test of the loan API")
+    parser.add_argument('--rate', default='10', help="Arrival rates (req/s), comma separated: one step per rate")
+    parser.add_argument('--duration', type=float, default=30, help="Duration of each step (s)")
+    parser.add_argument('--concurrency', type=int, default=64, help="Maximum requests in flight")
+    parser.add_argument('--credit-check-ratio', type=float, default=0.3,
+                        help="Share of arrivals sent to /credit-check once clients exist")
+    parser.add_argument('--timeout', type=float, default=30, help="Request timeout (s)")
+    parser.add_argument('--warmup', type=int, default=5, help="Requests sent before measuring")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="API base URL")
+    parser.add_argument('--no-start', action='store_true', help="Use an already running stack")
+    parser.add_argument('--workers', action='append', metavar='[SERVICE=]N',
+                        help="Worker processes of the started stack, as for exec.py")
+    parser.add_argument('--output', help="JSON file for the step summaries")
+    args = parser.parse_args(argv)
+
+    rates = [float(rate) for rate in args.rate.split(',')]
+    processes = []
+    if not args.no_start:
+        from exec import parse_workers, start_stack, stop_stack
+        try:
+            processes, _ = start_stack(output=subprocess.DEVNULL, workers=parse_workers(args.workers))
+        except (ValueError, RuntimeError, TimeoutError) as e:
+            sys.exit(f"Échec du démarrage: {e}")
+
+    try:
+        generator = LoadGenerator(args.url, args.concurrency, args.credit_check_ratio,
+                                  args.timeout, args.seed)
+        generator.warm_up(args.warmup)
+        summaries = []
+        for rate in rates:
+            results, elapsed = generator.run_step(rate, args.duration)
+            summary = summarize(rate, results, elapsed)
+            print_summary(summary)
+            summaries.append(summary)
+    finally:
+        if processes:
+            stop_stack(processes)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+# logConfig.py
+"""
+Logging setup shared by the API, the spyne services and the command line
+tools.
+
+Records are put on a bounded in-memory queue by the logging thread and
+written by a background QueueListener, so request threads never wait on
+log I/O. When the queue is full, records are dropped (and counted) instead
+of blocking.
+
+Levels come from configuration: LOAN_LOG_LEVEL for the process, and
+LOAN_LOG_LEVELS with "name=LEVEL" entries for individual loggers (suds,
+spyne.protocol, serviceComposite...) or for a whole service, by the name
+passed to setup_logging() ('api', 'credit_check_service'...). suds and
+spyne default to WARNING, since at DEBUG they log every XML envelope.
+DEBUG records of those payload loggers, when enabled, are sampled at
+LOAN_LOG_SAMPLE_RATE.
+
+Every record carries the service name and the ID of the request it was
+logged for (request_id), in text or JSON (LOAN_LOG_FORMAT=json). With
+LOAN_LOG_TRACE, a request sent with "X-Debug-Trace: 1" is logged in full
+at DEBUG, payloads included, while other requests keep the configured
+levels. The request ID and trace flag follow the request to the backend
+services as HTTP headers (request_headers()).
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import uuid
+
+import config
+import metrics
+
+DROPPED_RECORDS = metrics.counter('loan_log_records_dropped_total', "Log records dropped because the log queue was full")
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+TRACE_HEADER = 'X-Debug-Trace'
+
+# Library loggers that log whole messages at DEBUG
+PAYLOAD_LOGGERS = ('suds', 'spyne')
+DEFAULT_LEVELS = {'suds': 'WARNING', 'spyne': 'WARNING'}
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(service)s %(request_id)s] %(name)s: %(message)s'
+
+request_id = contextvars.ContextVar('request_id', default=None)
+request_traced = contextvars.ContextVar('request_traced', default=False)
+
+_listener = None
+_pid = None
+
+
+def parse_levels(spec):
+    """{logger name: level} from "name=LEVEL,name=LEVEL" """
+    levels = {}
+    for entry in spec.split(','):
+        name, _, level = entry.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def bind_request(identifier=None, traced=False):
+    """Tag the records logged in the current context with a request ID,
+    generated when none is given; traced requests are logged in full"""
+    identifier = identifier or uuid.uuid4().hex
+    request_id.set(identifier)
+    request_traced.set(bool(traced) and config.LOG_TRACE)
+    return identifier
+
+
+def bind_request_headers(headers):
+    """bind_request() from the headers of an incoming request"""
+    traced = (headers.get(TRACE_HEADER) or '').strip().lower() in ('1', 'true', 'yes', 'on')
+    return bind_request(headers.get(REQUEST_ID_HEADER), traced)
+
+
+def request_headers():
+    """Headers passing the current request ID and trace flag on to a backend call"""
+    identifier = request_id.get()
+    if identifier is None:
+        return {}
+    headers = {REQUEST_ID_HEADER: identifier}
+    if request_traced.get():
+        headers[TRACE_HEADER] = '1'
+    return headers
+
+
+def wsgi_request_context(app):
+    """Run a WSGI app with the request ID and trace flag of its request bound.
+
+    The response is collected inside the context so that records logged
+    while it is serialized are tagged too (service responses are small).
+    """
+
+    def wrapped(environ, start_response):
+        def call():
+            bind_request_headers({
+                header: environ.get('HTTP_' + header.upper().replace('-', '_'))
+                for header in (REQUEST_ID_HEADER, TRACE_HEADER)
+            })
+            return list(app(environ, start_response))
+        return contextvars.copy_context().run(call)
+
+    return wrapped
+
+
+class ContextFilter(logging.Filter):
+    """Tags records with the service and request ID, applies the trace and
+    sampling rules. Runs in the thread that logs, before the record is queued."""
+
+    def __init__(self, service, levels, sample_rate):
+        super().__init__()
+        self.service = service
+        self.levels = levels
+        self.sample_rate = sample_rate
+        self._thresholds = {}
+
+    def threshold(self, name):
+        """Configured level of a logger: its own entry or its closest parent's"""
+        level = self._thresholds.get(name)
+        if level is None:
+            parts = name.split('.')
+            for i in range(len(parts), 0, -1):
+                level = self.levels.get('.'.join(parts[:i]))
+                if level is not None:
+                    break
+            else:
+                level = self.levels['']
+            self._thresholds[name] = level
+        return level
+
+    def filter(self, record):
+        record.service = self.service
+        record.request_id = request_id.get() or '-'
+        if request_traced.get():
+            return True
+        # In trace mode loggers are opened to DEBUG, the configured levels
+        # are enforced here for untraced requests
+        if record.levelno < self.threshold(record.name):
+            return False
+        if record.levelno < logging.INFO and record.name.startswith(PAYLOAD_LOGGERS):
+            return random.random() < self.sample_rate
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full"""
+
+    def prepare(self, record):
+        # The stdlib formats the message here, in the thread that logs; the
+        # listener thread does it instead
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED_RECORDS.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'service': record.service,
+            'request_id': record.request_id,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(service, level=None):
+    """Configure the root logger of the process for service.
+
+    Can be called again, e.g. in a forked worker process, to replace the
+    configuration and restart the writer thread.
+    """
+    global _listener, _pid
+    if _listener is not None:
+        if _pid == os.getpid():
+            _listener.stop()
+        _listener = None
+
+    levels = {**DEFAULT_LEVELS, **parse_levels(config.LOG_LEVELS)}
+    service_level = levels.pop(service, None)
+    root_level = level or service_level or config.LOG_LEVEL
+    levels[''] = root_level.upper() if isinstance(root_level, str) else root_level
+    levels = {name: logging.getLevelName(value) if isinstance(value, str) else value
+              for name, value in levels.items()}
+
+    output = logging.StreamHandler()
+    if config.LOG_FORMAT == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(ContextFilter(service, levels, config.LOG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    for name, value in levels.items():
+        # Traced requests need DEBUG records to be created at all
+        logging.getLogger(name or None).setLevel(logging.DEBUG if config.LOG_TRACE else value)
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    _pid = os.getpid()
+    return _listener
+
+
+@atexit.register
+def _flush():
+    # Write out what is still queued when the process exits
+    if _listener is not None and _pid == os.getpid():
+        _listener.stop()
@@ -0,0 +1,113 @@
+# marketData.py
+"""
+National property market dataset: price per m² and recent sales volume by
+postcode and property type.
+
+A snapshot is a single .npy file holding a direct-address table with one
+row per postcode (00000-99999) and one column per property type, so a
+lookup is a plain array index. Snapshots are memory-mapped, and a new one
+can be swapped in by replacing the file while the service is running.
+
+    python marketData.py build market.csv market.npy
+
+The CSV needs postcode, property_type, price_per_sqm and recent_sales
+columns. Several rows for the same postcode and type (e.g. one per
+commune) are merged, weighting prices by recent sales.
+"""
+
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+from reloadableFile import ReloadableFile
+
+PROPERTY_TYPES = {'apartment': 0, 'house': 1}
+PROPERTY_TYPE_ALIASES = {'appartement': 'apartment', 'maison': 'house'}
+POSTCODE_COUNT = 100000
+
+SNAPSHOT_DTYPE = np.dtype([('price_per_sqm', '<f4'), ('recent_sales', '<i4')])
+
+
+def build_snapshot(csv_path, snapshot_path):
+    """Convert a market CSV into a snapshot, replacing snapshot_path atomically"""
+    postcodes, types, prices, sales = [], [], [], []
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            property_type = row['property_type'].strip().lower()
+            property_type = PROPERTY_TYPE_ALIASES.get(property_type, property_type)
+            if property_type not in PROPERTY_TYPES:
+                continue
+            postcodes.append(int(row['postcode']))
+            types.append(PROPERTY_TYPES[property_type])
+            prices.append(float(row['price_per_sqm']))
+            sales.append(int(row['recent_sales']))
+
+    index = np.asarray(postcodes, dtype=np.int64) * len(PROPERTY_TYPES) + np.asarray(types)
+    prices = np.asarray(prices, dtype=np.float64)
+    sales = np.asarray(sales, dtype=np.int64)
+    weights = np.maximum(sales, 1)
+    size = POSTCODE_COUNT * len(PROPERTY_TYPES)
+
+    total_weight = np.bincount(index, weights=weights, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        price_per_sqm = np.bincount(index, weights=prices * weights, minlength=size) / total_weight
+
+    table = np.zeros(size, dtype=SNAPSHOT_DTYPE)
+    table['price_per_sqm'] = np.where(total_weight > 0, price_per_sqm, np.nan)
+    table['recent_sales'] = np.bincount(index, weights=sales, minlength=size)
+
+    # Write next to the target then rename, so readers never see a partial file
+    tmp_path = f"{snapshot_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, table.reshape(POSTCODE_COUNT, len(PROPERTY_TYPES)))
+    os.replace(tmp_path, snapshot_path)
+    return len(postcodes)
+
+
+class MarketDataset:
+    """One memory-mapped market snapshot"""
+
+    def __init__(self, path):
+        self.path = path
+        self.table = np.load(path, mmap_mode='r')
+
+    def lookup(self, postcode, property_type):
+        """Market info for a postcode and property type, None when unknown"""
+        try:
+            row = self.table[int(postcode), PROPERTY_TYPES[property_type]]
+        except (KeyError, ValueError, IndexError):
+            return None
+        if np.isnan(row['price_per_sqm']):
+            return None
+        return {
+            'price_per_sqm': float(row['price_per_sqm']),
+            'recent_sales': int(row['recent_sales'])
+        }
+
+
+class MarketDataStore(ReloadableFile):
+    """
+    Current market snapshot of the process, reloaded when the snapshot file
+    is replaced (see ReloadableFile). Requests already holding the old
+    dataset keep using it; new lookups see the new one.
+    """
+
+    kind = 'Market data snapshot'
+
+    def load(self):
+        return MarketDataset(self.path)
+
+    def lookup(self, postcode, property_type):
+        dataset = self.current()
+        return dataset.lookup(postcode, property_type) if dataset else None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'build':
+        sys.exit("usage: python marketData.py build market.csv market.npy")
+    start = time.perf_counter()
+    rows = build_snapshot(sys.argv[2], sys.argv[3])
+    print(f"{rows} lignes converties en {time.perf_counter() - start:.2f}s -> {sys.argv[3]}")
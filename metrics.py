@@ -0,0 +1,309 @@
+# metrics.py
+"""
+Minimal Prometheus metrics: counters, gauges and histograms with labels,
+rendered in the Prometheus text exposition format.
+
+Metrics live in a per-process registry (REGISTRY) and are served on
+/metrics by the API (api_service.py) and by every spyne service
+(serviceRunner.py).
+
+A service running as several worker processes (workers.py) shares its
+metrics through a directory (share()): every worker writes the values of
+its registry there every SHARE_INTERVAL seconds and when answering a
+scrape, and the worker answering /metrics renders the values of all of
+them. Counters and histograms are summed over the workers, including
+those that have exited so the totals never go down; gauges are given per
+live worker, under a "worker" label.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds, from sub-millisecond local calls to slow SOAP calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds between two writes of the values of a worker to the shared directory
+SHARE_INTERVAL = 1.0
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+    # Values of several workers are summed, or kept apart under a worker label
+    per_worker = False
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._render(self.labelnames, items)
+
+    def _render(self, labelnames, items):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in items:
+            lines.extend(self._samples(labelnames, key, value))
+        return lines
+
+    def _samples(self, labelnames, key, value):
+        return [f"{self.name}{_format_labels(labelnames, key)} {_format_value(value)}"]
+
+    def state(self):
+        """Values as JSON-serializable [label values, value] pairs"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    @staticmethod
+    def _add(total, value):
+        return total + value
+
+    def render_workers(self, states):
+        """Render the values of several workers, from (worker, alive, state) tuples"""
+        if self.per_worker:
+            items = sorted((tuple(key) + (str(worker),), value)
+                           for worker, alive, state in states if alive
+                           for key, value in state)
+            return self._render(self.labelnames + ('worker',), items)
+        merged = {}
+        for _, _, state in states:
+            for key, value in state:
+                key = tuple(key)
+                merged[key] = self._add(merged[key], value) if key in merged else value
+        return self._render(self.labelnames, sorted(merged.items()))
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    per_worker = True
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non cumulative) counts, then sum
+                state = self._values[key] = [[0] * len(self.buckets), 0.0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def state(self):
+        with self._lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+
+    @staticmethod
+    def _add(total, value):
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1]]
+
+    def _samples(self, labelnames, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(labelnames, key, [('le', _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class WorkerStates:
+    """Registry values of the worker processes of a service, one JSON file
+    per process in a shared directory"""
+
+    def __init__(self, directory, worker):
+        self.directory = directory
+        self.worker = worker
+        self.path = os.path.join(directory, f'{os.getpid()}.json')
+        self._lock = threading.Lock()
+
+    def write(self, state):
+        temporary = self.path + '.tmp'
+        with self._lock:
+            with open(temporary, 'w') as f:
+                json.dump({'worker': self.worker, 'pid': os.getpid(), 'metrics': state}, f)
+            # Readers never see a partly written file
+            os.replace(temporary, self.path)
+
+    def read(self):
+        """(worker, alive, {metric name: state}) of every process that wrote its values"""
+        states = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            states.append((data['worker'], _alive(data['pid']), data['metrics']))
+        return states
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._shared = None
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def state(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.state() for metric in metrics}
+
+    def share(self, directory, worker, interval=SHARE_INTERVAL):
+        """Render the values of every worker writing to directory, and write
+        the values of this one there every interval seconds"""
+        self._shared = WorkerStates(directory, worker)
+        self._write_shared()
+
+        def write_periodically():
+            while True:
+                time.sleep(interval)
+                self._write_shared()
+
+        threading.Thread(target=write_periodically, name='metrics-share', daemon=True).start()
+        atexit.register(self._write_shared)
+
+    def _write_shared(self):
+        try:
+            self._shared.write(self.state())
+        except OSError as e:
+            # The directory goes away with the supervisor
+            logging.debug(f"Could not share metrics: {e}")
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        if self._shared is None:
+            for metric in metrics:
+                lines.extend(metric.render())
+        else:
+            self._write_shared()
+            states = self._shared.read()
+            for metric in metrics:
+                lines.extend(metric.render_workers(
+                    [(worker, alive, state.get(metric.name, [])) for worker, alive, state in states]))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+share = REGISTRY.share
+
+
+def make_metrics_app(registry=REGISTRY):
+    """WSGI app serving the registry in the Prometheus text format"""
+
+    def metrics_app(environ, start_response):
+        body = registry.render().encode()
+        start_response('200 OK', [('Content-Type', CONTENT_TYPE),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
+
+    return metrics_app
@@ -0,0 +1,86 @@
+# parsedApplication.py
+
+import hashlib
+import json
+import logging
+import re
+from extractService import parse_fields
+
+LOAN_AMOUNT_RE = re.compile(r'(\d+)\s*EUR')
+SIZE_RE = re.compile(r'(\d+)\s*m²')
+POSTCODE_RE = re.compile(r'\b(\d{5})\b')
+HOUSE_KEYWORDS = ("maison", "villa", "pavillon")
+
+
+def parsing_val(value_str):
+    if not value_str:
+        return 0
+    return int(value_str.replace('EUR', ''))
+
+
+def parse_amount(fields, field):
+    """Monthly amount of a field as an int, 0 when missing or malformed"""
+    try:
+        return parsing_val(fields.get(field))
+    except ValueError as e:
+        logging.error(f"Erreur parsing {field}: {e}")
+        return 0
+
+
+class ParsedApplication:
+    """
+    A loan application parsed once, shared by every stage of the pipeline.
+
+    Holds the extracted fields (the extraction service field map) along
+    with the values the stages need, already converted to numbers.
+    """
+    __slots__ = ('fields', 'email', 'loan_amount', 'monthly_income', 'monthly_expenses',
+                 'location', 'postcode', 'property_type', 'size_sqm', 'description')
+
+    def __init__(self, fields):
+        self.fields = fields
+
+        email = fields.get('Email', '').split()
+        self.email = email[0] if email else None
+
+        amount_match = LOAN_AMOUNT_RE.match(fields.get('Montant du Prêt Demandé', ''))
+        self.loan_amount = float(amount_match.group(1)) if amount_match else 0
+
+        self.monthly_income = parse_amount(fields, 'Revenu Mensuel')
+        self.monthly_expenses = parse_amount(fields, 'Dépenses Mensuelles')
+
+        # Property information from the address and description
+        address = fields.get('Adresse', '')
+        self.location = "Lyon" if "Lyon" in address else "Paris"
+        postcode_match = POSTCODE_RE.search(address)
+        self.postcode = postcode_match.group(1) if postcode_match else None
+        self.description = fields.get('Description de la Propriété', '')
+        description = self.description.lower()
+        self.property_type = "house" if any(word in description for word in HOUSE_KEYWORDS) else "apartment"
+        size_match = SIZE_RE.search(self.description)
+        self.size_sqm = float(size_match.group(1)) if size_match else 75.0  # Default size
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(parse_fields(text))
+
+    def property_info(self):
+        """Arguments of the property evaluation service"""
+        return {
+            "location": self.location,
+            "property_type": self.property_type,
+            "size_sqm": self.size_sqm,
+            "description": self.description,
+            "postcode": self.postcode
+        }
+
+    def to_dict(self):
+        """Field map as returned by the extraction service"""
+        return dict(self.fields)
+
+    def content_key(self):
+        """Hash of the application content, the same for texts that only
+        differ in layout (whitespace, line breaks, field order)"""
+        normalized = {label: ' '.join(value.split()) for label, value in self.fields.items()}
+        encoded = json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
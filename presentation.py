@@ -0,0 +1,41 @@
+# presentation.py
+
+# Text rendering of the structured results returned by the property
+# evaluation and approval decision services
+
+
+def render_property_evaluation(evaluation):
+    if evaluation.error:
+        return f"ERREUR: {evaluation.error}"
+    if not evaluation.compliant:
+        return f"NON CONFORME: {evaluation.reason}"
+    return f"""EVALUATION DÉTAILLÉE:
+Valeur Estimée: {evaluation.estimated_value:,.2f} EUR
+Analyse du Marché: {evaluation.market_value:,.2f} EUR
+État du Bien: {evaluation.condition}
+Conformité Légale: Conforme
+Remarques: {evaluation.notes}"""
+
+
+def render_decision(decision):
+    if decision.error:
+        return f"ERREUR: {decision.error}"
+    if decision.approved:
+        return f"""DÉCISION: APPROUVÉ
+Score de Risque: {decision.risk_score:.1f}/100
+Probabilité de Défaut: {decision.default_probability:.1%}
+Taux d'Intérêt Proposé: {decision.interest_rate:.1%}
+Montant Approuvé: {decision.approved_amount:,.2f} EUR
+Politique de Crédit: version {decision.policy_version}"""
+
+    reasons = '\n'.join(f"- {v}" for v in decision.reasons or [])
+    return f"""DÉCISION: REFUSÉ
+Score de Risque: {decision.risk_score:.1f}/100
+Probabilité de Défaut: {decision.default_probability:.1%}
+Raisons:
+{reasons}
+Recommandations:
+- Améliorer le score de crédit
+- Réduire le ratio dette/revenu
+- Augmenter la période d'emploi stable
+Politique de Crédit: version {decision.policy_version}"""
@@ -2,12 +2,12 @@
 
 import logging
 import sys
-from spyne import Application, rpc, ServiceBase, Unicode, Integer, Boolean, Float
+from spyne import Application, rpc, ServiceBase, ComplexModel, Unicode, Integer, Boolean, Float, Array
 from spyne.protocol.soap import Soap11
-from spyne.server.wsgi import WsgiApplication
-from spyne.util.wsgi_wrapper import run_twisted
+from serviceRunner import run_service
+from marketData import MarketDataStore
+import config
 
-logging.basicConfig(level=logging.DEBUG)
 
 class PropertyDatabase:
     def __init__(self):
@@ -29,17 +29,53 @@ class PropertyDatabase:
             'Lyon': {'min_size': 14, 'max_height': 22, 'protected_areas': ['Vieux Lyon']}
         }
 
+        # National dataset by postcode, when a snapshot is configured
+        self.market_snapshot = None
+        if config.MARKET_DATA_PATH:
+            self.market_snapshot = MarketDataStore(config.MARKET_DATA_PATH,
+                                                   config.MARKET_DATA_CHECK_INTERVAL)
+
+    def get_market_info(self, location, property_type, postcode=None):
+        """Market info by postcode from the national dataset, else by city"""
+        if postcode and self.market_snapshot:
+            market_info = self.market_snapshot.lookup(postcode, property_type)
+            if market_info:
+                return market_info
+        return self.market_data.get(location, {}).get(property_type)
+
+
+# Loaded once per process and shared by every request
+property_database = PropertyDatabase()
+
+class PropertyRequest(ComplexModel):
+    location = Unicode
+    property_type = Unicode
+    size_sqm = Float
+    description = Unicode
+    postcode = Unicode
+
+
+class PropertyEvaluation(ComplexModel):
+    estimated_value = Float
+    market_value = Float
+    condition = Unicode
+    notes = Unicode
+    compliant = Boolean
+    reason = Unicode
+    error = Unicode
+
+
 class property_evaluation_service(ServiceBase):
     def __init__(self):
         super(property_evaluation_service, self).__init__()
-        self.db = PropertyDatabase()
+        self.db = property_database
 
-    def _analyze_market_data(self, location, property_type, size_sqm):
+    def _analyze_market_data(self, location, property_type, size_sqm, postcode=None):
         """Analyze market data to estimate property value"""
-        if location not in self.db.market_data or property_type.lower() not in self.db.market_data[location]:
+        market_info = self.db.get_market_info(location, property_type.lower(), postcode)
+        if market_info is None:
             raise KeyError("Location or property type not found in database")
             
-        market_info = self.db.market_data[location][property_type.lower()]
         base_value = market_info['price_per_sqm'] * size_sqm
         
         # Adjust based on market activity
@@ -103,43 +139,60 @@ class property_evaluation_service(ServiceBase):
             'reason': None
         }
 
-    @rpc(Unicode, Unicode, Float, Unicode, _returns=Unicode)
-    def evaluate_property(ctx, location, property_type, size_sqm, description):
+    def _evaluate(self, location, property_type, size_sqm, description, postcode=None):
         """
         Evaluate a property based on market data, virtual inspection, and legal compliance.
         """
         try:
-            # Create instance for this request
-            service = property_evaluation_service()
-            
             # 1. Market Data Analysis
-            market_value = service._analyze_market_data(location, property_type, size_sqm)
+            market_value = self._analyze_market_data(location, property_type, size_sqm, postcode)
             
             # 2. Virtual Inspection
-            condition_assessment = service._virtual_inspection(description)
+            condition_assessment = self._virtual_inspection(description)
             
             # 3. Legal Compliance Check
-            legal_status = service._check_legal_compliance(location, size_sqm, description)
+            legal_status = self._check_legal_compliance(location, size_sqm, description)
             
             # Calculate final evaluation
             if not legal_status['compliant']:
-                return f"NON CONFORME: {legal_status['reason']}"
+                return PropertyEvaluation(compliant=False, reason=legal_status['reason'])
                 
             # Adjust market value based on condition
             final_value = market_value * condition_assessment['value_multiplier']
             
-            return f"""EVALUATION DÉTAILLÉE:
-Valeur Estimée: {final_value:,.2f} EUR
-Analyse du Marché: {market_value:,.2f} EUR
-État du Bien: {condition_assessment['status']}
-Conformité Légale: {'Conforme' if legal_status['compliant'] else 'Non Conforme'}
-Remarques: {condition_assessment['notes']}"""
+            return PropertyEvaluation(
+                estimated_value=final_value,
+                market_value=market_value,
+                condition=condition_assessment['status'],
+                notes=condition_assessment['notes'],
+                compliant=True
+            )
 
         except KeyError:
-            return "ERREUR: Localisation ou type de bien non reconnu"
+            return PropertyEvaluation(error="Localisation ou type de bien non reconnu")
         except Exception as e:
             logging.error(f"Evaluation error: {e}")
-            return "ERREUR: Impossible d'évaluer la propriété"
+            return PropertyEvaluation(error="Impossible d'évaluer la propriété")
+
+    @rpc(Unicode, Unicode, Float, Unicode, Unicode, _returns=PropertyEvaluation)
+    def evaluate_property(ctx, location, property_type, size_sqm, description, postcode):
+        """
+        Evaluate a property based on market data, virtual inspection, and legal compliance.
+        """
+        # Create instance for this request
+        service = property_evaluation_service()
+        return service._evaluate(location, property_type, size_sqm, description, postcode)
+
+    @rpc(Array(PropertyRequest), _returns=Array(PropertyEvaluation))
+    def evaluate_property_batch(ctx, requests):
+        """
+        Evaluate a batch of properties in one pass, in request order.
+        """
+        service = property_evaluation_service()
+        return [
+            service._evaluate(r.location, r.property_type, r.size_sqm, r.description, r.postcode)
+            for r in requests or []
+        ]
 
 # Define the Spyne application
 application = Application([property_evaluation_service],
@@ -148,10 +201,4 @@ application = Application([property_evaluation_service],
                         out_protocol=Soap11())
 
 if __name__ == '__main__':
-    wsgi_app = WsgiApplication(application)
-    
-    twisted_apps = [
-        (wsgi_app, b'property_evaluation_service'),
-    ]
-    
-    sys.exit(run_twisted(twisted_apps, 8003))
\ No newline at end of file
+    sys.exit(run_service(application, 'property_evaluation_service', 8003))
@@ -0,0 +1,78 @@
+# reloadableFile.py
+"""
+Values loaded from a file and kept current while the process runs: the
+market data snapshot (marketData.py) and the lending policies
+(institutionPolicies.py) are replaced without restarting the services.
+"""
+
+import logging
+import os
+import threading
+import time
+
+# Signature of a file that could not be found
+MISSING = 'missing'
+
+
+class ReloadableFile:
+    """
+    Value built from a file by load(), reloaded when the file is replaced.
+
+    The file is checked at most every check_interval seconds and loaded
+    again when its inode, modification time or size has changed. The new
+    value is swapped in as a whole, so callers holding the previous one keep
+    using it. A file that is missing or does not load is reported through
+    failed() and the previous value stays current; a file that failed is not
+    tried again until it changes.
+    """
+
+    # Name of the file in log messages
+    kind = 'File'
+
+    def __init__(self, path, check_interval=5.0, value=None):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._value = value
+        self._signature = None
+        self._reload()
+        self._checked_at = time.monotonic()
+
+    def load(self):
+        """Value built from the file at self.path"""
+        raise NotImplementedError
+
+    def loaded(self, value):
+        logging.info(f"{self.kind} loaded from {self.path}")
+
+    def failed(self, error):
+        logging.error(f"Failed to load {self.kind.lower()} {self.path}: {error}")
+
+    def _reload(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            if self._signature != MISSING:
+                self._signature = MISSING
+                self.failed(e)
+            return
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+        self._signature = signature
+        try:
+            value = self.load()
+        except Exception as e:
+            self.failed(e)
+            return
+        self._value = value
+        self.loaded(value)
+
+    def current(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    self._reload()
+        return self._value
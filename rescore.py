@@ -0,0 +1,82 @@
+# rescore.py
+"""
+Rescore stored loan applications with the vectorized risk engine.
+
+Input is a JSONL file with one stored application per line, holding the
+evaluate_loan_application arguments (credit_score, property_value,
+loan_amount, monthly_income, monthly_expenses, stable_employment_years,
+late_payments, has_bankruptcy) and optionally a client_id.
+
+    python rescore.py applications.jsonl --output scores.jsonl
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+from riskEngine import score_applications, POLICY_VIOLATIONS
+
+INPUT_FIELDS = (
+    'credit_score', 'property_value', 'loan_amount', 'monthly_income',
+    'monthly_expenses', 'stable_employment_years', 'late_payments', 'has_bankruptcy'
+)
+
+
+def load_applications(path):
+    """Read stored applications into one column per decision input"""
+    client_ids = []
+    columns = {field: [] for field in INPUT_FIELDS}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            client_ids.append(record.get('client_id', f"row_{len(client_ids)}"))
+            for field in INPUT_FIELDS:
+                columns[field].append(record[field])
+    return client_ids, columns
+
+
+def write_scores(output, client_ids, scores):
+    violations = scores['violations']
+    for i, client_id in enumerate(client_ids):
+        output.write(json.dumps({
+            'client_id': client_id,
+            'error': bool(scores['error'][i]),
+            'approved': bool(scores['approved'][i]),
+            'risk_score': float(scores['risk_score'][i]),
+            'default_probability': float(scores['default_probability'][i]),
+            'rate_tier': str(scores['rate_tier'][i]),
+            'interest_rate': float(scores['interest_rate'][i]),
+            'violations': [message for name, message in POLICY_VIOLATIONS.items() if violations[name][i]],
+            'policy_version': scores['policy_version']
+        }, ensure_ascii=False) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rescore stored loan applications")
+    parser.add_argument('input', help="JSONL file of stored applications")
+    parser.add_argument('--output', help="JSONL file for the scores (default: stdout)")
+    args = parser.parse_args(argv)
+
+    client_ids, columns = load_applications(args.input)
+
+    start = time.perf_counter()
+    scores = score_applications(**columns)
+    elapsed = time.perf_counter() - start
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            write_scores(output, client_ids, scores)
+    else:
+        write_scores(sys.stdout, client_ids, scores)
+
+    print(f"{len(client_ids)} demandes réévaluées en {elapsed * 1000:.1f} ms: "
+          f"{int(np.sum(scores['approved']))} approuvées, {int(np.sum(scores['error']))} en erreur",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
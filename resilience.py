@@ -0,0 +1,261 @@
+# resilience.py
+"""
+Bounds on the time spent waiting for the backend services.
+
+- Deadline: a request gets a time budget when it enters the pipeline
+  (request_deadline()). It is held in a context variable, so it follows
+  the request into the pipeline stages and hedged calls, and every backend
+  call waits at most the time left (call_timeout()).
+- Timeouts: each service has its own timeout (LOAN_SERVICE_TIMEOUT and
+  LOAN_SERVICE_TIMEOUTS), applied to the suds client or HTTP connection of
+  every call.
+- Circuit breakers: after LOAN_BREAKER_FAILURES consecutive failures of a
+  service, calls to it fail at once with CircuitOpen for
+  LOAN_BREAKER_RESET seconds, after which one trial call decides whether it
+  closes again. Only calls the service did not answer count as failures
+  (is_failure()): a fault it returns for a rejected request is an answer.
+- Hedging: an idempotent call still unanswered after a delay is sent a
+  second time, and the first reply wins (hedged()).
+
+Breaker states, timeouts, rejections and hedges are exported as metrics,
+and breaker states on the API /health endpoint (circuit_states()).
+"""
+
+import contextvars
+import http.client
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import contextmanager
+
+import config
+import metrics
+
+CIRCUIT_STATE = metrics.gauge(
+    'loan_circuit_state', "Circuit breaker state of a backend service (0 closed, 1 half-open, 2 open)", ('service',))
+CIRCUIT_REJECTIONS = metrics.counter(
+    'loan_circuit_rejections_total', "Backend calls failed fast by an open circuit breaker", ('service',))
+DOWNSTREAM_TIMEOUTS = metrics.counter(
+    'loan_downstream_timeouts_total', "Backend calls that timed out or ran out of request deadline", ('service',))
+HEDGED_CALLS = metrics.counter(
+    'loan_hedged_calls_total', "Hedged backend calls by the attempt that answered first", ('service', 'winner'))
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+deadline = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request ran out of time before a backend call could complete"""
+
+
+class ServiceError(Exception):
+    """A service answered with an HTTP error status instead of a reply or a
+    fault of its own"""
+
+    def __init__(self, service, status, detail=''):
+        super().__init__(f"{service}: HTTP {status} {detail}".rstrip())
+        self.service = service
+        self.status = status
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a service whose circuit breaker is open"""
+
+    def __init__(self, service, retry_after):
+        super().__init__(f"Service {service} indisponible, réessayez dans {retry_after}s")
+        self.service = service
+        self.retry_after = retry_after
+
+
+def parse_timeouts(spec):
+    """{service: seconds} from "service=seconds,service=seconds" """
+    timeouts = {}
+    for entry in spec.split(','):
+        name, _, seconds = entry.partition('=')
+        if name.strip() and seconds.strip():
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+SERVICE_TIMEOUTS = parse_timeouts(config.SERVICE_TIMEOUTS)
+
+
+def service_timeout(service):
+    return SERVICE_TIMEOUTS.get(service, config.SERVICE_TIMEOUT)
+
+
+@contextmanager
+def request_deadline(seconds=None):
+    """Give the block a time budget of seconds (LOAN_REQUEST_DEADLINE by
+    default, none when 0). A deadline already set by the caller is kept
+    when it is sooner."""
+    seconds = config.REQUEST_DEADLINE if seconds is None else seconds
+    current = deadline.get()
+    limit = time.monotonic() + seconds if seconds > 0 else None
+    if limit is None or (current is not None and current <= limit):
+        yield current
+        return
+    token = deadline.set(limit)
+    try:
+        yield limit
+    finally:
+        deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, None without a deadline"""
+    limit = deadline.get()
+    return None if limit is None else limit - time.monotonic()
+
+
+def check_deadline():
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Délai de traitement de la demande dépassé")
+
+
+def call_timeout(service):
+    """Timeout of the next call to service: its own timeout, capped by the
+    time left before the deadline"""
+    timeout = service_timeout(service)
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        DOWNSTREAM_TIMEOUTS.inc(service=service)
+        raise DeadlineExceeded("Délai de traitement de la demande dépassé")
+    return min(timeout, left)
+
+
+def is_timeout(error):
+    """Whether a call failed on a timeout, also when urllib wrapped it"""
+    return isinstance(error, TimeoutError) or isinstance(getattr(error, 'reason', None), TimeoutError)
+
+
+def is_failure(error):
+    """Whether a failed call counts against the service circuit breaker: no
+    answer (connection error, timeout) or an HTTP 5xx error"""
+    if is_timeout(error) or isinstance(error, (OSError, http.client.HTTPException)):
+        return True
+    return isinstance(error, ServiceError) and error.status >= 500
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker of one service"""
+
+    def __init__(self, service, failure_threshold=None, reset_timeout=None):
+        self.service = service
+        self.failure_threshold = failure_threshold or config.BREAKER_FAILURES
+        self.reset_timeout = config.BREAKER_RESET if reset_timeout is None else reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0, service=service)
+
+    def _set_state(self, state):
+        self.state = state
+        CIRCUIT_STATE.set(STATE_VALUES[state], service=self.service)
+
+    def _acquire(self):
+        """Let a call through, or raise CircuitOpen"""
+        with self._lock:
+            if self.state == OPEN:
+                waited = time.monotonic() - self.opened_at
+                if waited < self.reset_timeout:
+                    CIRCUIT_REJECTIONS.inc(service=self.service)
+                    raise CircuitOpen(self.service, max(1, round(self.reset_timeout - waited)))
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                # A single trial call at a time while half-open
+                if self._trial_running:
+                    CIRCUIT_REJECTIONS.inc(service=self.service)
+                    raise CircuitOpen(self.service, 1)
+                self._trial_running = True
+
+    def _record(self, success):
+        with self._lock:
+            self._trial_running = False
+            if success:
+                self.failures = 0
+                if self.state != CLOSED:
+                    self._set_state(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                if self.state != OPEN:
+                    self._set_state(OPEN)
+
+    @contextmanager
+    def guard(self):
+        """Count the outcome of the call made in the block, or raise
+        CircuitOpen without running it. The transport raises the fault of a
+        rejected request as is, and an HTTP error as a ServiceError."""
+        self._acquire()
+        try:
+            yield
+        except Exception as e:
+            if is_timeout(e):
+                DOWNSTREAM_TIMEOUTS.inc(service=self.service)
+                left = remaining()
+                if left is not None and left <= 0:
+                    # Cut short by the request deadline rather than by the
+                    # service timeout: nothing to hold against the service
+                    with self._lock:
+                        self._trial_running = False
+                    if isinstance(e, DeadlineExceeded):
+                        raise
+                    raise DeadlineExceeded("Délai de traitement de la demande dépassé") from e
+            # The service answered a fault: it is up
+            self._record(not is_failure(e))
+            raise
+        self._record(True)
+
+    def to_dict(self):
+        return {'state': self.state, 'failures': self.failures}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(service):
+    """The circuit breaker of service, shared by every transport of the process"""
+    with _breakers_lock:
+        if service not in _breakers:
+            _breakers[service] = CircuitBreaker(service)
+        return _breakers[service]
+
+
+def circuit_states():
+    with _breakers_lock:
+        return {service: b.to_dict() for service, b in _breakers.items()}
+
+
+def hedged(executor, service, delay, function, *args, **kwargs):
+    """function(*args, **kwargs), sent a second time on executor when the
+    first attempt has not answered after delay seconds; the first attempt
+    to succeed wins. Both attempts run in the caller's context."""
+    first = executor.submit(contextvars.copy_context().run, function, *args, **kwargs)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    second = executor.submit(contextvars.copy_context().run, function, *args, **kwargs)
+    attempts = {first: 'first', second: 'hedge'}
+    pending = set(attempts)
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded("Délai de traitement de la demande dépassé")
+        for future in done:
+            if future.exception() is None:
+                HEDGED_CALLS.inc(service=service, winner=attempts[future])
+                return future.result()
+            error = future.exception()
+    raise error
@@ -0,0 +1,87 @@
+# resultCache.py
+"""
+Bounded TTL cache with in-flight request coalescing, used by the API to
+avoid reprocessing applications it has just processed.
+
+get_or_compute(key, compute) returns the cached value of key while it is
+fresh. Otherwise the first caller runs compute() and every concurrent
+caller with the same key waits for that single run and gets its result, or
+its exception, instead of starting a run of its own. Only results are
+cached: a failed run is retried by the next caller.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import metrics
+
+RESULT_CACHE_LOOKUPS = metrics.counter(
+    'loan_result_cache_total', "Result cache lookups by result (hit, miss, coalesced)", ('result',))
+RESULT_CACHE_ENTRIES = metrics.gauge('loan_result_cache_entries', "Results currently cached")
+
+
+class ResultCache:
+    """Keeps at most maxsize results for ttl seconds; maxsize or ttl 0
+    disables caching but keeps coalescing concurrent calls"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (expiry time, value), least recently used first
+        self._entries = OrderedDict()
+        # key -> Future of the run in progress
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """(value, 'hit' | 'miss' | 'coalesced') of key, running compute() on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    RESULT_CACHE_LOOKUPS.inc(result='hit')
+                    return entry[1], 'hit'
+                del self._entries[key]
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+
+        if not leader:
+            RESULT_CACHE_LOOKUPS.inc(result='coalesced')
+            return future.result(), 'coalesced'
+
+        RESULT_CACHE_LOOKUPS.inc(result='miss')
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            # Cached before the run is forgotten, so no caller sees neither
+            self._put(key, value)
+            del self._in_flight[key]
+        future.set_result(value)
+        return value, 'miss'
+
+    def _put(self, key, value):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        RESULT_CACHE_ENTRIES.set(len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        RESULT_CACHE_ENTRIES.set(0)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,166 @@
+# riskEngine.py
+
+import numpy as np
+from institutionPolicies import RULES, current_policies
+
+# Policy violations, in the order the decision service reports them
+POLICY_VIOLATIONS = {name: message for name, _, _, _, message in RULES}
+
+# Refusal by the default probability limit, which the decision service
+# does not report as a reason
+DEFAULT_RISK_REASON = "Probabilité de défaut trop élevée"
+
+
+def calculate_risk_scores(credit_score, debt_to_income, loan_to_value,
+                          stable_employment, late_payments, has_bankruptcy):
+    """Vectorized RiskAnalysis.calculate_risk_score.
+
+    Applies the adjustments in the same order as the scalar path so that
+    results are identical to the last bit.
+    """
+    risk_score = 100 + (credit_score - 700) / 10
+    risk_score = risk_score - debt_to_income * 100
+    risk_score = risk_score - loan_to_value * 50
+    risk_score = risk_score + stable_employment * 5
+    risk_score = risk_score - late_payments * 10
+    risk_score = np.where(has_bankruptcy, risk_score - 50, risk_score)
+    return np.maximum(0, np.minimum(100, risk_score))
+
+
+def predict_default_probabilities(risk_score, debt_to_income, loan_to_value,
+                                  stable_employment, late_payments, has_bankruptcy):
+    """Vectorized PredictionModel.predict_default_probability"""
+    probability = (100 - risk_score) / 100
+    probability = probability * np.where(debt_to_income > 0.45, 1.5, 0.8)
+    probability = probability * np.where(loan_to_value > 0.85, 1.3, 0.9)
+    probability = probability * np.where(stable_employment >= 2, 0.7, 1.2)
+    probability = probability * np.where(late_payments > 2, 1.5, 0.9)
+    probability = probability * np.where(has_bankruptcy, 2.0, 1.0)
+    return np.minimum(1.0, probability)
+
+
+def score_applications(credit_score, property_value, loan_amount, monthly_income,
+                       monthly_expenses, stable_employment_years, late_payments,
+                       has_bankruptcy, policies=None):
+    """
+    Score a portfolio of loan applications in one pass.
+
+    Every argument is an array (or a scalar broadcast against the others)
+    holding one entry per application. Returns a dict of arrays matching
+    what approval_decision_service would decide for each application:
+    risk scores, default probabilities, one violation mask per policy, the
+    mask of default probabilities over the limit, the approval mask, and
+    the rate tier and interest rate. The version of the policies applied
+    is returned with them. Rows the scalar service cannot
+    evaluate (zero income or property value) are flagged in the 'error'
+    mask and are never approved.
+
+    policies is a CompiledPolicies, the current policies of the decision
+    service (see institutionPolicies.py) by default.
+    """
+    if policies is None:
+        policies = current_policies()
+
+    credit_score, property_value, loan_amount, monthly_income, monthly_expenses = (
+        np.asarray(a, dtype=np.float64) for a in
+        (credit_score, property_value, loan_amount, monthly_income, monthly_expenses)
+    )
+    stable_employment_years = np.asarray(stable_employment_years, dtype=np.int64)
+    late_payments = np.asarray(late_payments, dtype=np.int64)
+    has_bankruptcy = np.asarray(has_bankruptcy, dtype=bool)
+
+    error = (monthly_income == 0) | (property_value == 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        debt_to_income = np.where(error, 0.0, monthly_expenses / monthly_income)
+        loan_to_value = np.where(error, 0.0, loan_amount / property_value)
+
+    risk_score = calculate_risk_scores(
+        credit_score, debt_to_income, loan_to_value,
+        stable_employment_years, late_payments, has_bankruptcy
+    )
+    default_probability = predict_default_probabilities(
+        risk_score, debt_to_income, loan_to_value,
+        stable_employment_years, late_payments, has_bankruptcy
+    )
+
+    violations = policies.violation_masks({
+        'credit_score': credit_score,
+        'debt_to_income': debt_to_income,
+        'loan_to_value': loan_to_value,
+        'stable_employment_years': stable_employment_years,
+    })
+    any_violation = np.logical_or.reduce(list(violations.values()))
+    default_risk = default_probability >= policies.max_default_probability
+    approved = ~error & ~any_violation & ~default_risk
+
+    tiers, (last_tier, _, last_rate) = policies.rate_tiers[:-1], policies.rate_tiers[-1]
+    # np.select needs at least one condition: the last tier alone always applies
+    conditions = [risk_score >= threshold for _, threshold, _ in tiers] or [np.zeros_like(risk_score, dtype=bool)]
+    rate_tier = np.select(conditions, [tier for tier, _, _ in tiers] or [last_tier], last_tier)
+    interest_rate = np.select(conditions, [rate for _, _, rate in tiers] or [last_rate], last_rate)
+
+    return {
+        'risk_score': risk_score,
+        'default_probability': default_probability,
+        'debt_to_income': debt_to_income,
+        'loan_to_value': loan_to_value,
+        'violations': violations,
+        'default_risk': default_risk,
+        'approved': approved,
+        'error': error,
+        'rate_tier': rate_tier,
+        'interest_rate': interest_rate,
+        'policy_version': policies.version,
+    }
+
+
+def what_if(credit_score, property_value, monthly_income, monthly_expenses,
+            stable_employment_years, late_payments, has_bankruptcy,
+            loan_amounts, down_payments=(0,), policies=None):
+    """
+    Decisions for one client over a grid of requested loan amounts and
+    down payments, in one score_applications() pass.
+
+    The down payment is deducted from the requested amount and the rest is
+    borrowed: point (i, j) is the decision for borrowing
+    loan_amounts[j] - down_payments[i] (at least 0). Returns the
+    score_applications() arrays with one row per down payment and one
+    column per loan amount, plus:
+
+    - 'borrowed': the amount evaluated at each point;
+    - 'max_approved': per down payment, the largest approved requested
+      amount (NaN when none is);
+    - 'min_refused': per down payment, the smallest refused requested
+      amount above it (NaN when none is), so the approval boundary lies
+      between the two;
+    - 'max_approvable_borrowed': the largest approved borrowed amount of
+      the grid, down payment deducted (NaN when none is). Unlike
+      'max_approved', it is not a requested amount.
+    """
+    loan_amounts = np.asarray(loan_amounts, dtype=np.float64)
+    down_payments = np.asarray(down_payments, dtype=np.float64)
+    borrowed = np.maximum(loan_amounts[np.newaxis, :] - down_payments[:, np.newaxis], 0.0)
+
+    # score_applications combines its masks as arrays: every input gets the grid shape
+    client = {
+        'credit_score': credit_score, 'property_value': property_value,
+        'monthly_income': monthly_income, 'monthly_expenses': monthly_expenses,
+        'stable_employment_years': stable_employment_years,
+        'late_payments': late_payments, 'has_bankruptcy': has_bankruptcy,
+    }
+    scores = score_applications(
+        loan_amount=borrowed, policies=policies,
+        **{name: np.broadcast_to(value, borrowed.shape) for name, value in client.items()}
+    )
+
+    approved = scores['approved']
+    max_approved = np.where(approved, loan_amounts, -np.inf).max(axis=1)
+    refused_above = ~approved & (loan_amounts > max_approved[:, np.newaxis])
+    min_refused = np.where(refused_above, loan_amounts, np.inf).min(axis=1)
+    max_approvable = np.where(approved, borrowed, -np.inf).max()
+
+    scores['borrowed'] = borrowed
+    scores['max_approved'] = np.where(np.isfinite(max_approved), max_approved, np.nan)
+    scores['min_refused'] = np.where(np.isfinite(min_refused), min_refused, np.nan)
+    scores['max_approvable_borrowed'] = max_approvable if np.isfinite(max_approvable) else np.nan
+    return scores
@@ -1,146 +1,136 @@
+import contextvars
 import logging
-import json
 import time
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-from suds.client import Client
-from spyne import ComplexModel, Unicode
-import random
-import re
-
-logging.basicConfig(level=logging.DEBUG)
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
 
-def parsing_val(value_str):
-    if not value_str:
-        return 0
-    return int(value_str.replace('EUR', ''))
+import numpy as np
+from spyne import ComplexModel, Unicode
 
+import config
+import metrics
+import resilience
+import riskEngine
+from parsedApplication import ParsedApplication
+from presentation import render_property_evaluation, render_decision
+from storage import create_storage
+from transports import create_transport, service_name
 
 class DictionaryItem(ComplexModel):
     __namespace__ = ''
     key = Unicode
     value = Unicode
 
-class FinancialDatabase:
-    def __init__(self):
-        self.clients = {
-            'default_client': {
-                'value_debt': 5000,
-                'late_payments': 2,
-                'has_bankruptcy': False
-            }
-        }
+# Dependencies between the stages of process_and_store. A stage only starts
+# once every stage it depends on has produced its result.
+STAGE_DEPENDENCIES = {
+    'property': (),
+    'credit_check': (),
+    'store': ('property', 'credit_check'),
+    'decision': ('store',),
+}
 
-    def add_client(self, client_id, data):
-        # Simulate some financial history when adding a new client
-        self.clients[client_id] = {
-            'value_debt': random.randint(1000, 1005),
-            'late_payments': random.randint(0, 2),
-            'has_bankruptcy': random.choice([True, False])
-        }
-        logging.info(f"Données financière ajoutées pour ID: {client_id}")
-
-    def get_financial_data(self, client_id):
-        if client_id not in self.clients:
-            # Generate random data for new clients
-            self.add_client(client_id)
-        return self.clients.get(client_id)
-
-class ClientDatabase:
-    def __init__(self):
-        self.clients = {}
-
-    def add_client(self, client_id, data):
-        self.clients[client_id] = data
-        logging.info(f"Client {client_id} added to database")
-
-    def get_client(self, client_id):
-        return self.clients.get(client_id, None)
-
-    def get_monthly_expenses(self, client_id):
-        client_data = self.get_client(client_id)
-        if client_data and 'Dépenses Mensuelles' in client_data:
-            try:
-                return parsing_val(client_data['Dépenses Mensuelles'])
-            except ValueError:
-                logging.error(f"Erreur parsing ID: {client_id}")
-                return 0
-        return 0
-    
-    def get_monthly_income(self, client_id):
-        client_data = self.get_client(client_id)
-        if client_data and 'Revenu Mensuel' in client_data:
-            try:
-                return parsing_val(client_data['Revenu Mensuel'])
-            except ValueError as e:
-                logging.error(f"Erreur parsing ID: {e}")
-                return 0
-        return 0
+# Order used when the pipeline runs sequentially
+STAGE_ORDER = ('property', 'credit_check', 'store', 'decision')
+
+STAGE_SECONDS = metrics.histogram(
+    'loan_stage_seconds', "Time spent in each pipeline stage", ('stage', 'status'))
+APPLICATIONS = metrics.counter(
+    'loan_applications_total', "Processed applications by outcome", ('outcome',))
+APPLICATION_SECONDS = metrics.histogram(
+    'loan_application_seconds', "End-to-end processing time of an application by outcome", ('outcome',))
+
+
+class NonCompliantProperty(ValueError):
+    """Application rejected because its property does not comply"""
+
+
+def decision_outcome(decision):
+    """Metrics outcome of a LoanDecision: approved, refused or error"""
+    if decision.error:
+        return 'error'
+    return 'approved' if decision.approved else 'refused'
 
 
 class ServiceComposite:
-    def __init__(self):
-        self.client_db = ClientDatabase()
-        self.financial_db = FinancialDatabase()
-        
-        self.SERVICE_WSDL_EXTRACT = 'http://localhost:8000/extract_information_service?wsdl'
-        self.SERVICE_WSDL_SOLVENCY = 'http://localhost:8001/credit_check_service?wsdl'
-        self.SERVICE_WSDL_PROPERTY = 'http://localhost:8003/property_evaluation_service?wsdl'
-        self.SERVICE_WSDL_APPROVAL = 'http://localhost:8004/approval_decision_service?wsdl'
+    def __init__(self, concurrent=None, max_workers=None, transport=None, storage=None):
+        if concurrent is None:
+            concurrent = config.PIPELINE_CONCURRENT
+        self.executor = None
+        if concurrent:
+            self.executor = ThreadPoolExecutor(
+                max_workers=max_workers or config.PIPELINE_MAX_WORKERS,
+                thread_name_prefix='pipeline'
+            )
+
+        # "memory" or "sqlite", see storage.py
+        self.storage = create_storage(storage)
+        self.client_db = self.storage.client_db
+        self.financial_db = self.storage.financial_db
         
-        self.extract_client = Client(self.SERVICE_WSDL_EXTRACT)
-        self.solvency_client = Client(self.SERVICE_WSDL_SOLVENCY)
-        self.property_client = Client(self.SERVICE_WSDL_PROPERTY)
-        self.approval_client = Client(self.SERVICE_WSDL_APPROVAL)
+        # "soap" or "local", see transports.py
+        self.transport = create_transport(transport)
+
+        # Credit checks are idempotent: a slow one is hedged with a second
+        # call after LOAN_HEDGE_DELAY seconds (see resilience.hedged)
+        self.hedge_executor = None
+        if config.HEDGE_DELAY > 0:
+            self.hedge_executor = ThreadPoolExecutor(
+                max_workers=max_workers or config.PIPELINE_MAX_WORKERS,
+                thread_name_prefix='hedge'
+            )
+
+        # Optional callable(stage, seconds) told how long each stage took
+        self.stage_observer = None
 
-    def get_loan_amount(self, text):
-        """Extract loan amount from text"""
-        match = re.search(r'Montant du Prêt Demandé:\s*(\d+)\s*EUR', text)
-        return float(match.group(1)) if match else 0
+    @staticmethod
+    def _as_application(application):
+        """Parse raw application text, ParsedApplication instances pass through"""
+        if isinstance(application, ParsedApplication):
+            return application
+        return ParsedApplication.from_text(application)
 
-    def get_employment_years(self, text):
+    def get_employment_years(self, application):
         """Extract employment years (simulated)"""
         # In reality, this would come from the application form
         return 3  # Default to 3 years for demonstration
 
-    def get_approval_decision(self, client_id, text, property_evaluation):
+    def _decision_inputs(self, client_id, application, property_evaluation, solvency=None):
+        """Gather the evaluate_loan_application arguments for a stored client"""
+        # Get financial data
+        financial_data = self.financial_db.get_financial_data(client_id)
+        
+        # Extract credit score from solvency (simulated mapping)
+        if solvency is None:
+            solvency = self.get_credit_check(client_id)
+        credit_score = 750 if solvency == "solvent" else 650
+        
+        # Property value from the evaluation, 0 when it could not be estimated
+        property_value = property_evaluation.estimated_value or 0
+        
+        # Get employment stability
+        stable_employment_years = self.get_employment_years(application)
+        
+        return {
+            'credit_score': credit_score,
+            'property_value': property_value,
+            'loan_amount': application.loan_amount,
+            'monthly_income': application.monthly_income,
+            'monthly_expenses': application.monthly_expenses,
+            'stable_employment_years': stable_employment_years,
+            'late_payments': financial_data.late_payments,
+            'has_bankruptcy': financial_data.has_bankruptcy,
+            'property_valuation': property_value
+        }
+
+    def get_approval_decision(self, client_id, application, property_evaluation, solvency=None):
         """Get approval decision for a loan application"""
         try:
-            # Get financial data
-            financial_data = self.financial_db.get_financial_data(client_id)
-            
-            # Extract credit score from solvency (simulated mapping)
-            solvency = self.get_credit_check(client_id)
-            credit_score = 750 if solvency == "solvent" else 650
-            
-            # Extract property value from evaluation
-            value_match = re.search(r'Valeur Estimée: ([\d,]+\.?\d*)', property_evaluation)
-            property_value = float(value_match.group(1).replace(',', '')) if value_match else 0
-            
-            # Get loan amount
-            loan_amount = self.get_loan_amount(text)
-            
-            # Get monthly income and expenses
-            monthly_income = self.client_db.get_monthly_income(client_id)
-            monthly_expenses = self.client_db.get_monthly_expenses(client_id)
-            
-            # Get employment stability
-            stable_employment_years = self.get_employment_years(text)
+            application = self._as_application(application)
+            inputs = self._decision_inputs(client_id, application, property_evaluation, solvency)
             
             # Call approval service
-            decision = self.approval_client.service.evaluate_loan_application(
-                credit_score=credit_score,
-                property_value=property_value,
-                loan_amount=loan_amount,
-                monthly_income=monthly_income,
-                monthly_expenses=monthly_expenses,
-                stable_employment_years=stable_employment_years,
-                late_payments=financial_data['late_payments'],
-                has_bankruptcy=financial_data['has_bankruptcy'],
-                property_valuation=property_value
-            )
-            
-            return decision
+            return self.transport.evaluate_loan_application(**inputs)
             
         except Exception as e:
             logging.error(f"Failed to get approval decision: {e}")
@@ -148,108 +138,325 @@ class ServiceComposite:
 
     def extract_property_info(self, text):
         """Extract property information from loan request content"""
-        # Extract location from address
-        address_match = re.search(r'Adresse:\s*(.*?)(?=\s*\n|$)', text)
-        location = "Paris"  # Default
-        if address_match:
-            address = address_match.group(1)
-            if "Lyon" in address:
-                location = "Lyon"
-        
-        # Extract property type and size from description
-        description_match = re.search(r'Description de la Propriété:\s*(.*?)(?=\s*\n|$)', text)
-        description = description_match.group(1) if description_match else ""
-        
-        property_type = "apartment"  # Default
-        if any(word in description.lower() for word in ["maison", "villa", "pavillon"]):
-            property_type = "house"
-        
-        # Try to extract size from description
-        size_match = re.search(r'(\d+)\s*m²', description)
-        size_sqm = float(size_match.group(1)) if size_match else 75.0  # Default size
-        
-        return {
-            "location": location,
-            "property_type": property_type,
-            "size_sqm": size_sqm,
-            "description": description
-        }
+        return ParsedApplication.from_text(text).property_info()
 
-    def evaluate_property(self, text):
+    def evaluate_property(self, application):
         """Evaluate the property using the property evaluation service"""
         try:
-            property_info = self.extract_property_info(text)
+            application = self._as_application(application)
             
             # Call the property evaluation service
-            return self.property_client.service.evaluate_property(
-                location=property_info["location"],
-                property_type=property_info["property_type"],
-                size_sqm=property_info["size_sqm"],
-                description=property_info["description"]
-            )
+            return self.transport.evaluate_property(**application.property_info())
             
         except Exception as e:
             logging.error(f"Property evaluation error: {e}")
             raise
 
-    def process_and_store(self, client_id, text):
+    @staticmethod
+    def _is_non_compliant(property_evaluation):
+        return not property_evaluation.error and not property_evaluation.compliant
+
+    def _stage_property(self, state):
+        property_evaluation = self.evaluate_property(state['application'])
+        if self._is_non_compliant(property_evaluation):
+            raise NonCompliantProperty(render_property_evaluation(property_evaluation))
+        return property_evaluation
+
+    def _stage_credit_check(self, state):
+        # Runs on the parsed application before anything is stored, so that it
+        # can overlap with the property evaluation
+        application = state['application']
+        financial_data = self.financial_db.simulate_history()
+        solvency = self._credit_check(
+            application.monthly_income, application.monthly_expenses, financial_data
+        )
+        return solvency, financial_data
+
+    def _stage_store(self, state):
+        _, financial_data = state['credit_check']
+        with self.storage.batch():
+            self.client_db.add_client(state['client_id'], state['application'])
+            self.financial_db.add_client(state['client_id'], financial_data)
+
+    def _stage_decision(self, state):
+        solvency, _ = state['credit_check']
+        return self.get_approval_decision(
+            state['client_id'], state['application'], state['property'], solvency=solvency
+        )
+
+    @contextmanager
+    def _observed(self, stage):
+        """Report the duration of the block to the stage observer"""
+        start = time.perf_counter()
+        status = 'error'
         try:
-            # First evaluate the property
-            property_evaluation = self.evaluate_property(text)
-            if property_evaluation.startswith("NON CONFORME"):
-                raise ValueError(property_evaluation)
-
-            # Call information extraction service
-            info_response = self.extract_client.service.text_to_json(text)
-            client_data = json.loads(info_response)
-            
-            # Store client and financial data
-            self.client_db.add_client(client_id, client_data)
-            self.financial_db.add_client(client_id, {})
-            
-            # Get approval decision
-            approval_decision = self.get_approval_decision(client_id, text, property_evaluation)
+            yield
+            status = 'ok'
+        finally:
+            elapsed = time.perf_counter() - start
+            STAGE_SECONDS.observe(elapsed, stage=stage, status=status)
+            if self.stage_observer is not None:
+                self.stage_observer(stage, elapsed)
+
+    def _call_stage(self, stage, state):
+        with self._observed(stage):
+            return getattr(self, f"_stage_{stage}")(state)
+
+    def _run_stages(self, state):
+        """Run every pipeline stage, honouring STAGE_DEPENDENCIES.
+
+        Without an executor the stages run one after another in STAGE_ORDER.
+        Otherwise each stage is submitted as soon as its dependencies are
+        done, and the first failing stage aborts the whole run. Either way
+        the run stops with DeadlineExceeded once the request deadline has
+        passed.
+        """
+        if self.executor is None:
+            for stage in STAGE_ORDER:
+                resilience.check_deadline()
+                state[stage] = self._call_stage(stage, state)
+            return state
+
+        remaining = list(STAGE_ORDER)
+        pending = {}
+        try:
+            while remaining or pending:
+                for stage in list(remaining):
+                    if all(dep in state for dep in STAGE_DEPENDENCIES[stage]):
+                        remaining.remove(stage)
+                        # Stages see the caller's context variables (request timings...)
+                        future = self.executor.submit(contextvars.copy_context().run,
+                                                      self._call_stage, stage, dict(state))
+                        pending[future] = stage
+                done, _ = wait(pending, timeout=resilience.remaining(), return_when=FIRST_COMPLETED)
+                if not done:
+                    raise resilience.DeadlineExceeded("Délai de traitement de la demande dépassé")
+                for future in done:
+                    state[pending.pop(future)] = future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+        return state
+
+    def process_and_store(self, client_id, application):
+        """Process one application, given as raw text or as a ParsedApplication"""
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            application = self._as_application(application)
+            # Every stage and backend call of the run shares one deadline
+            with resilience.request_deadline():
+                state = self._run_stages({'client_id': client_id, 'application': application})
+            outcome = decision_outcome(state['decision'])
             
             logging.info(f"Client {client_id} processed with decision")
             
             return {
-                "client_data": client_data,
-                "property_evaluation": property_evaluation,
-                "approval_decision": approval_decision
+                "client_data": application.to_dict(),
+                "property_evaluation": render_property_evaluation(state['property']),
+                "approval_decision": render_decision(state['decision'])
             }
             
         except Exception as e:
+            if isinstance(e, NonCompliantProperty):
+                outcome = 'non_conforme'
             logging.error(f"Failed to process and store client data: {e}")
             raise
 
+        finally:
+            APPLICATIONS.inc(outcome=outcome)
+            APPLICATION_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+
+
+    def process_batch(self, applications):
+        """Process a list of (client_id, application) pairs with one batch call per service.
+
+        Returns one entry per application, in order: the process_and_store
+        result dict, or the NonCompliantProperty that rejected the application.
+        Every application is observed with the latency of the whole batch.
+        """
+        start = time.perf_counter()
+        outcomes = [None] * len(applications)
+
+        def count(outcome):
+            APPLICATIONS.inc(outcome=outcome)
+            APPLICATION_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+
+        try:
+            # The backend calls of the whole batch share one deadline
+            with resilience.request_deadline():
+                if not applications:
+                    return outcomes
+
+                applications = [(client_id, self._as_application(application))
+                                for client_id, application in applications]
+
+                # 1. Property evaluation for the whole batch
+                property_requests = [application.property_info() for _, application in applications]
+                with self._observed('property_batch'):
+                    evaluations = self.transport.evaluate_property_batch(property_requests)
+
+                accepted = []
+                for index, evaluation in enumerate(evaluations):
+                    if self._is_non_compliant(evaluation):
+                        outcomes[index] = NonCompliantProperty(render_property_evaluation(evaluation))
+                        count('non_conforme')
+                    else:
+                        accepted.append(index)
+                if not accepted:
+                    return outcomes
+
+                # 2. Credit checks on freshly simulated financial histories
+                financial_data = [self.financial_db.simulate_history() for _ in accepted]
+                credit_requests = []
+                for index, financial in zip(accepted, financial_data):
+                    application = applications[index][1]
+                    credit_requests.append({
+                        'monthly_income': application.monthly_income,
+                        'monthly_expenses': application.monthly_expenses,
+                        'outstanding_debt': financial.value_debt,
+                        'late_payments': financial.late_payments,
+                        'has_bankruptcy': financial.has_bankruptcy
+                    })
+                with self._observed('credit_check_batch'):
+                    solvencies = self.transport.credit_check_batch(credit_requests)
+
+                # 3. Store clients, then 4. decide for the whole batch
+                with self._observed('store_batch'), self.storage.batch():
+                    for position, index in enumerate(accepted):
+                        client_id, application = applications[index]
+                        self.client_db.add_client(client_id, application)
+                        self.financial_db.add_client(client_id, financial_data[position])
+                decision_requests = []
+                for position, index in enumerate(accepted):
+                    client_id, application = applications[index]
+                    decision_requests.append(self._decision_inputs(
+                        client_id, application, evaluations[index], solvencies[position]
+                    ))
+                with self._observed('decision_batch'):
+                    decisions = self.transport.evaluate_loan_application_batch(decision_requests)
+
+                for position, index in enumerate(accepted):
+                    count(decision_outcome(decisions[position]))
+                    outcomes[index] = {
+                        "client_data": applications[index][1].to_dict(),
+                        "property_evaluation": render_property_evaluation(evaluations[index]),
+                        "approval_decision": render_decision(decisions[position])
+                    }
+
+                logging.info(f"Batch of {len(applications)} applications processed")
+                return outcomes
+
+        except Exception as e:
+            logging.error(f"Failed to process batch: {e}")
+            for outcome in outcomes:
+                if outcome is None:
+                    count('error')
+            raise
+
+    def what_if(self, client_id, loan_amounts, down_payments=(0,)):
+        """Approval of a stored client over a grid of requested loan amounts
+        and down payments (see riskEngine.what_if).
+
+        The property is evaluated and the credit checked once, then every
+        grid point is decided in one vectorized pass with the policies of
+        the decision service. Raises ValueError for an unknown client or a
+        non-compliant property.
+
+        The boundary of each down payment is given in requested amounts
+        (max_approved_amount, min_refused_amount), while
+        max_approvable_borrowed is the largest approved amount actually
+        borrowed, down payment deducted.
+        """
+        try:
+            record = self.client_db.get_record(client_id)
+            if not record:
+                raise ValueError(f"Aucun client trouvé avec ID: {client_id}")
+            application = ParsedApplication(record.to_dict())
+
+            with resilience.request_deadline():
+                property_evaluation = self._call_stage('property', {'application': application})
+                solvency = self.get_credit_check(client_id)
+            inputs = self._decision_inputs(client_id, application, property_evaluation, solvency)
+
+            with self._observed('what_if'):
+                scores = riskEngine.what_if(
+                    inputs['credit_score'], inputs['property_value'], inputs['monthly_income'],
+                    inputs['monthly_expenses'], inputs['stable_employment_years'],
+                    inputs['late_payments'], inputs['has_bankruptcy'],
+                    loan_amounts, down_payments
+                )
+
+        except Exception as e:
+            logging.error(f"Failed to run what-if grid: {e}")
+            raise
+
+        def amount(value):
+            return None if np.isnan(value) else float(value)
+
+        approved = scores['approved']
+        boundary = []
+        for row, down_payment in enumerate(down_payments):
+            refused = np.flatnonzero(np.asarray(loan_amounts) == scores['min_refused'][row])
+            boundary.append({
+                'down_payment': float(down_payment),
+                'max_approved_amount': amount(scores['max_approved'][row]),
+                'min_refused_amount': amount(scores['min_refused'][row]),
+                'reasons': self._what_if_reasons(scores, row, refused[0]) if refused.size else [],
+            })
+
+        return {
+            'policy_version': scores['policy_version'],
+            'inputs': {name: value for name, value in inputs.items()
+                       if name not in ('loan_amount', 'property_valuation')},
+            'loan_amounts': [float(a) for a in loan_amounts],
+            'down_payments': [float(d) for d in down_payments],
+            'approved': approved.tolist(),
+            'rate_tier': np.where(approved, scores['rate_tier'], None).tolist(),
+            'interest_rate': np.where(approved, scores['interest_rate'], None).tolist(),
+            'boundary': boundary,
+            'max_approvable_borrowed': amount(scores['max_approvable_borrowed']),
+        }
+
+    @staticmethod
+    def _what_if_reasons(scores, row, column):
+        """Why a what-if grid point is refused"""
+        reasons = [message for name, message in riskEngine.POLICY_VIOLATIONS.items()
+                   if scores['violations'][name][row, column]]
+        if scores['default_risk'][row, column]:
+            reasons.append(riskEngine.DEFAULT_RISK_REASON)
+        return reasons
 
     def get_client_info(self, client_id):
-        client_data = self.client_db.get_client(client_id)
-        if not client_data:
+        record = self.client_db.get_record(client_id)
+        if not record:
             raise ValueError(f"Aucun client trouvé avec ID: {client_id}")
-        return client_data
+        return record.to_dict()
 
     def get_credit_check(self, client_id):
         try:
-            client_data = self.client_db.get_client(client_id)
-            if not client_data:
+            record = self.client_db.get_record(client_id)
+            if not record:
                 raise ValueError(f"Aucun client trouvé avec ID: {client_id}")
 
             financial_data = self.financial_db.get_financial_data(client_id)
             
-            monthly_income = self.client_db.get_monthly_income(client_id)
-            monthly_expenses = self.client_db.get_monthly_expenses(client_id)
-            
-            solvency = self.solvency_client.service.credit_check(
-                monthly_income=monthly_income,
-                monthly_expenses=monthly_expenses,
-                outstanding_debt=financial_data['value_debt'],
-                late_payments=financial_data['late_payments'],
-                has_bankruptcy=financial_data['has_bankruptcy']
-            )
-            
-            return solvency
+            with self._observed('credit_check'), resilience.request_deadline():
+                return self._credit_check(record.monthly_income, record.monthly_expenses, financial_data)
             
         except Exception as e:
             logging.error(f"Failed to perform credit check: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def _credit_check(self, monthly_income, monthly_expenses, financial_data):
+        request = dict(
+            monthly_income=monthly_income,
+            monthly_expenses=monthly_expenses,
+            outstanding_debt=financial_data.value_debt,
+            late_payments=financial_data.late_payments,
+            has_bankruptcy=financial_data.has_bankruptcy
+        )
+        if self.hedge_executor is None:
+            return self.transport.credit_check(**request)
+        return resilience.hedged(self.hedge_executor, service_name(config.SERVICE_WSDL_SOLVENCY),
+                                 config.HEDGE_DELAY, self.transport.credit_check, **request)
\ No newline at end of file
@@ -0,0 +1,131 @@
+# serviceRunner.py
+
+import json
+import socket
+import time
+import weakref
+from spyne import Application
+from spyne.protocol.json import JsonDocument
+from spyne.protocol.msgpack import MessagePackDocument
+from spyne.server.wsgi import WsgiApplication
+from spyne.util.wsgi_wrapper import run_twisted
+import config
+import metrics
+from logConfig import setup_logging, wsgi_request_context
+from workers import inherited_socket, prefork
+
+HANDLER_SECONDS = metrics.histogram(
+    'spyne_handler_seconds', "Time spent in the service method", ('service', 'protocol', 'method', 'outcome'))
+REQUEST_SECONDS = metrics.histogram(
+    'spyne_request_seconds', "Time from request start to serialized response",
+    ('service', 'protocol', 'method', 'outcome'))
+
+# Compact protocols served next to SOAP, on /<name>.<protocol>: the request
+# body is {"<method>": {<arguments>}} and the response is the bare return
+# value. Validation is 'soft' (type checks while decoding) instead of the
+# lxml schema validation of the SOAP endpoint
+COMPACT_PROTOCOLS = {
+    'json': JsonDocument,
+    'msgpack': MessagePackDocument,
+}
+
+
+def compact_application(application, protocol):
+    """The services of a SOAP application over a compact document protocol"""
+    document = COMPACT_PROTOCOLS[protocol]
+    return Application(application.services, tns=application.tns,
+                       in_protocol=document(validator='soft'), out_protocol=document())
+
+
+def make_health_app(name):
+    """WSGI app answering readiness probes for a service.
+
+    The app is only served once the twisted reactor listens on the service
+    port, so any answer means the service is ready to take requests.
+    """
+    body = json.dumps({'status': 'ready', 'service': name}).encode()
+
+    def health_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'application/json'),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
+
+    return health_app
+
+
+def instrument_application(application, name, protocol='soap'):
+    """Record handler and request times of a spyne application in the metrics registry"""
+    events = application.event_manager
+    # Handler start times by method context; spyne keeps ctx.udc for the
+    # services themselves
+    handler_starts = weakref.WeakKeyDictionary()
+
+    def method_call(ctx):
+        handler_starts[ctx] = time.perf_counter()
+
+    def handler_done(outcome):
+        def listener(ctx):
+            start = handler_starts.pop(ctx, None)
+            if start is not None:
+                HANDLER_SECONDS.observe(time.perf_counter() - start,
+                                        service=name, protocol=protocol,
+                                        method=ctx.method_name, outcome=outcome)
+        return listener
+
+    def request_done(outcome):
+        def listener(ctx):
+            # call_start is set by spyne when the request context is created
+            REQUEST_SECONDS.observe(time.time() - ctx.call_start,
+                                    service=name, protocol=protocol,
+                                    method=ctx.method_name or 'unknown', outcome=outcome)
+        return listener
+
+    events.add_listener('method_call', method_call)
+    events.add_listener('method_return_object', handler_done('ok'))
+    events.add_listener('method_exception_object', handler_done('fault'))
+    events.add_listener('method_return_document', request_done('ok'))
+    events.add_listener('method_exception_document', request_done('fault'))
+
+
+def serve_prefork(twisted_apps, port, workers):
+    """run_twisted for several processes: serve the apps from every worker
+    on the listening socket shared by workers.prefork"""
+    from twisted.internet import reactor
+    from twisted.web.resource import Resource
+    from twisted.web.server import Site
+    from twisted.web.wsgi import WSGIResource
+
+    sock, supervisor = prefork(port, workers)
+    root = Resource()
+    for app, url in twisted_apps:
+        root.putChild(url, WSGIResource(reactor, reactor, app))
+    # adoptStreamPort duplicates the descriptor
+    reactor.adoptStreamPort(sock.fileno(), socket.AF_INET, Site(root))
+    sock.close()
+    if supervisor is not None:
+        reactor.addSystemEventTrigger('before', 'shutdown', supervisor.stop)
+    return reactor.run()
+
+
+def run_service(application, name, port, workers=None):
+    """Serve a spyne application on /<name> (SOAP) and /<name>.json,
+    /<name>.msgpack (compact protocols), with its readiness probe on /health
+    and its metrics on /metrics, from LOAN_WORKERS processes"""
+    setup_logging(name)
+    instrument_application(application, name)
+    twisted_apps = [(wsgi_request_context(WsgiApplication(application)), name.encode())]
+
+    for protocol in COMPACT_PROTOCOLS:
+        compact = compact_application(application, protocol)
+        instrument_application(compact, name, protocol)
+        twisted_apps.append((wsgi_request_context(WsgiApplication(compact)), f"{name}.{protocol}".encode()))
+
+    twisted_apps += [
+        (make_health_app(name), b'health'),
+        (metrics.make_metrics_app(), b'metrics'),
+    ]
+
+    workers = workers or config.WORKERS
+    if workers > 1 or inherited_socket() is not None:
+        return serve_prefork(twisted_apps, port, workers)
+    return run_twisted(twisted_apps, port)
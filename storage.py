@@ -0,0 +1,363 @@
+# storage.py
+"""
+Client and financial record stores used by ServiceComposite.
+
+Two backends are available, selected with LOAN_STORAGE (see config.py):
+
+- "memory": plain dicts, lost on restart. Handy for tests and local runs.
+- "sqlite": records persisted in a local SQLite database in WAL mode, with
+  a size-bounded LRU in front of each table for hot lookups (not with
+  several LOAN_WORKERS processes, which would each cache stale records).
+
+Both backends expose the same ClientDatabase / FinancialDatabase interface,
+plus a batch() context manager grouping several writes into one transaction.
+"""
+
+import json
+import logging
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+import config
+from extractService import FIELD_LABELS
+from parsedApplication import ParsedApplication, parse_amount
+
+
+class FinancialRecord:
+    """Financial history of a client"""
+    __slots__ = ('value_debt', 'late_payments', 'has_bankruptcy')
+
+    def __init__(self, value_debt, late_payments, has_bankruptcy):
+        self.value_debt = value_debt
+        self.late_payments = late_payments
+        self.has_bankruptcy = has_bankruptcy
+
+    def to_dict(self):
+        return {
+            'value_debt': self.value_debt,
+            'late_payments': self.late_payments,
+            'has_bankruptcy': self.has_bankruptcy
+        }
+
+
+class ClientRecord:
+    """
+    Stored client: the extracted field values in FIELD_LABELS order (None
+    for a missing field) and the monthly amounts, parsed once at ingest.
+    """
+    __slots__ = ('values', 'monthly_income', 'monthly_expenses')
+
+    def __init__(self, values, monthly_income, monthly_expenses):
+        self.values = values
+        self.monthly_income = monthly_income
+        self.monthly_expenses = monthly_expenses
+
+    @classmethod
+    def from_fields(cls, fields):
+        """Record from an extraction service field map"""
+        return cls(
+            tuple(fields.get(label) for label in FIELD_LABELS),
+            parse_amount(fields, 'Revenu Mensuel'),
+            parse_amount(fields, 'Dépenses Mensuelles')
+        )
+
+    @classmethod
+    def from_application(cls, application):
+        """Record from a ParsedApplication, reusing the amounts it already parsed"""
+        return cls(
+            tuple(application.fields.get(label) for label in FIELD_LABELS),
+            application.monthly_income,
+            application.monthly_expenses
+        )
+
+    def to_dict(self):
+        """Field map as returned by the extraction service"""
+        return {label: value for label, value in zip(FIELD_LABELS, self.values) if value is not None}
+
+
+def as_client_record(data):
+    if isinstance(data, ClientRecord):
+        return data
+    if isinstance(data, ParsedApplication):
+        return ClientRecord.from_application(data)
+    return ClientRecord.from_fields(data)
+
+
+class FinancialDatabase:
+    def __init__(self):
+        self.clients = {
+            'default_client': FinancialRecord(value_debt=5000, late_payments=2, has_bankruptcy=False)
+        }
+
+    def simulate_history(self):
+        # Simulate some financial history for a new client
+        return FinancialRecord(
+            value_debt=random.randint(1000, 1005),
+            late_payments=random.randint(0, 2),
+            has_bankruptcy=random.choice([True, False])
+        )
+
+    def add_client(self, client_id, data=None):
+        data = self.clients[client_id] = data or self.simulate_history()
+        logging.info(f"Données financière ajoutées pour ID: {client_id}")
+        return data
+
+    def get_financial_data(self, client_id):
+        if client_id not in self.clients:
+            # Generate random data for new clients
+            self.add_client(client_id)
+        return self.clients.get(client_id)
+
+
+class ClientDatabase:
+    """
+    Clients stored as ClientRecord. add_client takes the extraction field
+    map (or a ParsedApplication); get_client gives the field map back.
+    """
+
+    def __init__(self):
+        self.clients = {}
+
+    def add_client(self, client_id, data):
+        self.clients[client_id] = as_client_record(data)
+        logging.info(f"Client {client_id} added to database")
+
+    def get_record(self, client_id):
+        return self.clients.get(client_id, None)
+
+    def get_client(self, client_id):
+        record = self.get_record(client_id)
+        return record.to_dict() if record else None
+
+    def get_monthly_expenses(self, client_id):
+        record = self.get_record(client_id)
+        return record.monthly_expenses if record else 0
+
+    def get_monthly_income(self, client_id):
+        record = self.get_record(client_id)
+        return record.monthly_income if record else 0
+
+
+class LRUCache:
+    """Thread-safe mapping keeping at most maxsize of the most recently used entries"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return None
+            return self._entries[key]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteStore:
+    """
+    SQLite database shared by the sqlite record stores.
+
+    Each thread gets its own connection. Writes go through transaction(),
+    which nests: only the outermost block commits, so a caller can group
+    the writes of several stores into a single commit. Work that must only
+    happen once the writes are stored, such as caching the written records,
+    is deferred with after_commit().
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS clients (
+            client_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            monthly_income INTEGER NOT NULL,
+            monthly_expenses INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS financial (
+            client_id TEXT PRIMARY KEY,
+            value_debt INTEGER NOT NULL,
+            late_payments INTEGER NOT NULL,
+            has_bankruptcy INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.connection().executescript(self.SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Transactions are managed explicitly in transaction()
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._local.conn = conn
+            self._local.depth = 0
+            self._local.on_commit = []
+        return conn
+
+    def after_commit(self, callback):
+        """Run callback when the current transaction commits, dropped if it
+        rolls back; at once outside a transaction"""
+        if getattr(self._local, 'depth', 0):
+            self._local.on_commit.append(callback)
+        else:
+            callback()
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+            for callback in self._local.on_commit:
+                callback()
+        finally:
+            self._local.depth = 0
+            self._local.on_commit = []
+
+
+class SqliteFinancialDatabase(FinancialDatabase):
+    def __init__(self, store, cache_size):
+        self.store = store
+        self.cache = LRUCache(cache_size)
+        with store.transaction() as conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO financial VALUES (?, ?, ?, ?)',
+                ('default_client', 5000, 2, False)
+            )
+
+    def add_client(self, client_id, data=None):
+        data = data or self.simulate_history()
+        with self.store.transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO financial VALUES (?, ?, ?, ?)',
+                (client_id, data.value_debt, data.late_payments, data.has_bankruptcy)
+            )
+            self.store.after_commit(lambda: self.cache.put(client_id, data))
+        logging.info(f"Données financière ajoutées pour ID: {client_id}")
+        return data
+
+    def get_financial_data(self, client_id):
+        data = self.cache.get(client_id)
+        if data is not None:
+            return data
+        row = self.store.connection().execute(
+            'SELECT value_debt, late_payments, has_bankruptcy FROM financial WHERE client_id = ?',
+            (client_id,)
+        ).fetchone()
+        if row is None:
+            # Generate random data for new clients
+            return self.add_client(client_id)
+        data = FinancialRecord(row[0], row[1], bool(row[2]))
+        self.cache.put(client_id, data)
+        return data
+
+
+class SqliteClientDatabase(ClientDatabase):
+    def __init__(self, store, cache_size):
+        self.store = store
+        self.cache = LRUCache(cache_size)
+
+    def add_client(self, client_id, data):
+        record = as_client_record(data)
+        with self.store.transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO clients VALUES (?, ?, ?, ?)',
+                (client_id, json.dumps(record.values, ensure_ascii=False),
+                 record.monthly_income, record.monthly_expenses)
+            )
+            self.store.after_commit(lambda: self.cache.put(client_id, record))
+        logging.info(f"Client {client_id} added to database")
+
+    def get_record(self, client_id):
+        record = self.cache.get(client_id)
+        if record is not None:
+            return record
+        row = self.store.connection().execute(
+            'SELECT data, monthly_income, monthly_expenses FROM clients WHERE client_id = ?',
+            (client_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        record = ClientRecord(tuple(json.loads(row[0])), row[1], row[2])
+        self.cache.put(client_id, record)
+        return record
+
+
+class MemoryStorage:
+    """Dict-backed stores, lost when the process exits"""
+
+    def __init__(self):
+        self.client_db = ClientDatabase()
+        self.financial_db = FinancialDatabase()
+
+    def batch(self):
+        return nullcontext()
+
+    def clear(self):
+        """Drop every stored record, as if the storage were new"""
+        self.client_db.clients = ClientDatabase().clients
+        self.financial_db.clients = FinancialDatabase().clients
+
+
+class SqliteStorage:
+    """SQLite-backed stores sharing one database file"""
+
+    def __init__(self, path=None, cache_size=None):
+        self.store = SqliteStore(path or config.SQLITE_PATH)
+        if cache_size is None:
+            # Worker processes sharing the database cannot see each other's
+            # writes in their caches: they always read the database
+            cache_size = config.STORAGE_CACHE_SIZE if config.WORKERS <= 1 else 0
+        self.client_db = SqliteClientDatabase(self.store, cache_size)
+        self.financial_db = SqliteFinancialDatabase(self.store, cache_size)
+
+    def batch(self):
+        """Group the writes made inside the block into one transaction"""
+        return self.store.transaction()
+
+
+STORAGES = {
+    'memory': MemoryStorage,
+    'sqlite': SqliteStorage,
+}
+
+
+def create_storage(name=None):
+    name = name or config.STORAGE
+    if name not in STORAGES:
+        raise ValueError(f"Stockage inconnu: {name} (choix: {', '.join(STORAGES)})")
+    return STORAGES[name]()
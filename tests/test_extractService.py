@@ -0,0 +1,118 @@
+# Field maps of the single-pass application parser
+
+import json
+import os
+
+import pytest
+
+from bench_extract import legacy_extract_fields
+from extractService import FIELD_LABELS, extract_fields, parse_fields
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+EXPECTED_FIELDS = {
+    'announce1 - rich.txt': {
+        'Nom du Client': "Alexandre Dubois",
+        'Adresse': "25 Avenue Montaigne, 75008 Paris, France",
+        'Email': "alexandre.dubois@email.com",
+        'Numéro de Téléphone': "+33 6 12 34 56 78",
+        'Montant du Prêt Demandé': "2500000 EUR",
+        'Durée du Prêt': "25 ans",
+        'Description de la Propriété': (
+            "Appartement de luxe de 250m² avec terrasse panoramique, entièrement rénové, situé dans le "
+            "Triangle d'Or. Prestations haut de gamme, triple exposition, vue sur la Tour Eiffel. "
+            "4 chambres, 3 salles de bains en marbre, cuisine équipée par un chef étoilé, domotique "
+            "dernière génération."),
+        'Revenu Mensuel': "35000 EUR",
+        'Dépenses Mensuelles': "8000 EUR",
+    },
+    'announce2 - worst.txt': {
+        'Nom du Client': "Martin Dupuis",
+        'Adresse': "15 Rue des Lilas, 69003 Lyon, France",
+        'Email': "martin.dupuis@email.com",
+        'Numéro de Téléphone': "+33 6 98 76 54 32",
+        'Montant du Prêt Demandé': "280000 EUR",
+        'Durée du Prêt': "30 ans",
+        'Description de la Propriété': (
+            "Appartement ancien de 45m² nécessitant des travaux importants. Humidité dans les murs, "
+            "électricité à refaire, simple vitrage. Situé au rez-de-chaussée dans une zone en développement."),
+        'Revenu Mensuel': "2200 EUR",
+        'Dépenses Mensuelles': "1800 EUR",
+    },
+    'announce3 - belavg.txt': {
+        'Nom du Client': "Sophie Martin",
+        'Adresse': "8 Rue de la Paix, 69006 Lyon, France",
+        'Email': "sophie.martin@email.com",
+        'Numéro de Téléphone': "+33 6 45 67 89 12",
+        'Montant du Prêt Demandé': "320000 EUR",
+        'Durée du Prêt': "25 ans",
+        'Description de la Propriété': (
+            "Appartement de 65m² dans résidence des années 80. État général correct mais quelques "
+            "rafraîchissements à prévoir. Double vitrage partiel, chauffage collectif, 2 chambres, "
+            "1 salle de bain."),
+        'Revenu Mensuel': "3500 EUR",
+        'Dépenses Mensuelles': "2200 EUR",
+    },
+    'announce4 - above avg.txt': {
+        'Nom du Client': "Philippe Lambert",
+        'Adresse': "42 Avenue Victor Hugo, 75016 Paris, France",
+        'Email': "philippe.lambert@email.com",
+        'Numéro de Téléphone': "+33 6 23 45 67 89",
+        'Montant du Prêt Demandé': "850000 EUR",
+        'Durée du Prêt': "20 ans",
+        'Description de la Propriété': (
+            "Bel appartement moderne de 95m² dans immeuble haussmannien. Rénové récemment, parquet, "
+            "moulures, cheminée. Cuisine équipée moderne, 3 chambres, lumineux, 3ème étage avec ascenseur."),
+        'Revenu Mensuel': "12000 EUR",
+        'Dépenses Mensuelles': "4500 EUR",
+    },
+}
+
+MULTILINE_APPLICATION = """Nom du Client: Claire Petit
+Adresse: 3 Rue Mercière, 69002 Lyon, France
+Email: claire.petit@email.com
+Numéro de Téléphone: +33 6 11 22 33 44
+Montant du Prêt Demandé: 210000 EUR
+Durée du Prêt: 20 ans
+Description de la Propriété: Appartement de 52m² au 2ème étage.
+Parquet ancien, double vitrage.
+   Cave et local à vélos.
+Revenu Mensuel: 4100 EUR
+Dépenses Mensuelles: 1300 EUR
+"""
+
+
+def read_sample(name):
+    with open(os.path.join(DATA_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED_FIELDS))
+def test_samples(name):
+    text = read_sample(name)
+    fields = parse_fields(text)
+    assert fields == EXPECTED_FIELDS[name]
+    # Same map, in the same order, as the per-field regexes it replaced
+    assert list(fields.items()) == list(json.loads(legacy_extract_fields(text)).items())
+    assert extract_fields(text) == legacy_extract_fields(text)
+
+
+def test_multiline_description():
+    fields = parse_fields(MULTILINE_APPLICATION)
+    assert list(fields) == list(FIELD_LABELS)
+    assert fields['Description de la Propriété'] == (
+        "Appartement de 52m² au 2ème étage.\nParquet ancien, double vitrage.\n   Cave et local à vélos.")
+    assert fields['Durée du Prêt'] == "20 ans"
+    assert fields['Revenu Mensuel'] == "4100 EUR"
+    assert fields['Dépenses Mensuelles'] == "1300 EUR"
+
+
+def test_missing_and_repeated_fields():
+    text = "Email: a@example.com\nNom du Client: Jean Roux\nEmail: b@example.com\nRevenu Mensuel: 3000 EUR"
+    assert parse_fields(text) == {
+        'Nom du Client': "Jean Roux",
+        'Email': "a@example.com",
+        'Revenu Mensuel': "3000 EUR",
+    }
+    assert list(parse_fields(text)) == ['Nom du Client', 'Email', 'Revenu Mensuel']
+    assert parse_fields("Aucun champ reconnu") == {}
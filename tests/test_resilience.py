@@ -0,0 +1,133 @@
+# Circuit breaker states, failure classification and deadlines
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import resilience
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, ServiceError
+
+
+class Fault(Exception):
+    """Stands for the fault of a request the service rejected"""
+
+
+def fail(breaker, error):
+    with pytest.raises(type(error)):
+        with breaker.guard():
+            raise error
+
+
+def open_breaker(reset_timeout=60):
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=reset_timeout)
+    for _ in range(3):
+        fail(breaker, ConnectionRefusedError("refused"))
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        fail(breaker, ConnectionRefusedError("refused"))
+    assert breaker.state == CLOSED
+
+    fail(breaker, TimeoutError("timed out"))
+    assert breaker.state == OPEN
+    calls = []
+    with pytest.raises(CircuitOpen):
+        with breaker.guard():
+            calls.append(1)
+    assert calls == []
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        fail(breaker, ConnectionRefusedError("refused"))
+    with breaker.guard():
+        pass
+    for _ in range(2):
+        fail(breaker, ConnectionRefusedError("refused"))
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_a_single_trial_through():
+    breaker = open_breaker(reset_timeout=0)
+    with breaker.guard():
+        assert breaker.state == HALF_OPEN
+        # A second call while the trial runs is refused
+        with pytest.raises(CircuitOpen):
+            with breaker.guard():
+                pass
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+
+def test_failed_trial_opens_again():
+    breaker = open_breaker(reset_timeout=0)
+    fail(breaker, ConnectionRefusedError("refused"))
+    assert breaker.state == OPEN
+
+
+@pytest.mark.parametrize('error', [Fault("Client.InvalidRequest"), ServiceError('test', 400, 'Bad Request')])
+def test_answers_are_not_failures(error):
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=60)
+    for _ in range(5):
+        fail(breaker, error)
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+
+def test_server_errors_are_failures():
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=60)
+    for _ in range(3):
+        fail(breaker, ServiceError('test', 500, 'Internal Server Error'))
+    assert breaker.state == OPEN
+
+
+def test_expired_deadline_is_not_held_against_the_service():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=60)
+    with resilience.request_deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(resilience.DeadlineExceeded):
+            with breaker.guard():
+                raise TimeoutError("timed out")
+    assert breaker.state == CLOSED
+
+
+def test_deadline_cuts_off_a_hedged_call():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return 'late'
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        start = time.monotonic()
+        try:
+            with resilience.request_deadline(0.2):
+                with pytest.raises(resilience.DeadlineExceeded):
+                    resilience.hedged(executor, 'test', 0.05, slow)
+        finally:
+            release.set()
+        assert time.monotonic() - start < 1
+
+
+def test_hedge_answers_when_the_first_attempt_hangs():
+    release = threading.Event()
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            release.wait(5)
+            return 'first'
+        return 'hedge'
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        try:
+            assert resilience.hedged(executor, 'test', 0.05, call) == 'hedge'
+        finally:
+            release.set()
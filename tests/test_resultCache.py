@@ -0,0 +1,100 @@
+# Result cache: freshness and coalescing of concurrent runs
+
+import threading
+import time
+
+import pytest
+
+from resultCache import ResultCache
+
+WAITERS = 4
+
+
+def run_concurrently(cache, compute):
+    """Start a run of compute() and WAITERS callers of the same key while it
+    is in progress; returns the (value or exception, result) of each"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return compute()
+
+    outcomes = []
+    lock = threading.Lock()
+
+    def call(function):
+        try:
+            outcome = cache.get_or_compute('key', function)
+        except Exception as e:
+            outcome = (e, 'raised')
+        with lock:
+            outcomes.append(outcome)
+
+    leader = threading.Thread(target=call, args=(blocking,))
+    leader.start()
+    started.wait(5)
+    waiters = [threading.Thread(target=call, args=(compute,)) for _ in range(WAITERS)]
+    for thread in waiters:
+        thread.start()
+    # Let the waiters reach the run in progress
+    time.sleep(0.1)
+    release.set()
+    for thread in [leader] + waiters:
+        thread.join(5)
+    return outcomes
+
+
+def test_coalesced_callers_get_the_result_of_the_single_run():
+    cache = ResultCache(maxsize=10, ttl=60)
+    runs = []
+
+    def compute():
+        runs.append(1)
+        return {'decision': 'approved'}
+
+    outcomes = run_concurrently(cache, compute)
+    assert len(runs) == 1
+    assert sorted(result for _, result in outcomes) == ['coalesced'] * WAITERS + ['miss']
+    values = [value for value, _ in outcomes]
+    assert all(value is values[0] for value in values)
+    assert cache.get_or_compute('key', compute) == (values[0], 'hit')
+
+
+def test_coalesced_callers_get_the_exception_of_the_single_run():
+    cache = ResultCache(maxsize=10, ttl=60)
+    runs = []
+    error = ConnectionRefusedError("refused")
+
+    def compute():
+        runs.append(1)
+        raise error
+
+    outcomes = run_concurrently(cache, compute)
+    assert len(runs) == 1
+    assert [value for value, _ in outcomes] == [error] * (WAITERS + 1)
+
+    # Failures are not cached: the next caller runs again
+    assert len(cache) == 0
+    with pytest.raises(ConnectionRefusedError):
+        cache.get_or_compute('key', compute)
+    assert len(runs) == 2
+
+
+def test_expired_results_are_computed_again():
+    cache = ResultCache(maxsize=10, ttl=0.05)
+    assert cache.get_or_compute('key', lambda: 1) == (1, 'miss')
+    assert cache.get_or_compute('key', lambda: 2) == (1, 'hit')
+    time.sleep(0.1)
+    assert cache.get_or_compute('key', lambda: 3) == (3, 'miss')
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = ResultCache(maxsize=2, ttl=60)
+    cache.get_or_compute('a', lambda: 'a')
+    cache.get_or_compute('b', lambda: 'b')
+    cache.get_or_compute('a', lambda: 'a2')
+    cache.get_or_compute('c', lambda: 'c')
+    assert cache.get_or_compute('a', lambda: 'a3') == ('a', 'hit')
+    assert cache.get_or_compute('b', lambda: 'b2') == ('b2', 'miss')
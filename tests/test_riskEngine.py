@@ -0,0 +1,109 @@
+# Vectorized risk engine against the decision service it mirrors
+
+import numpy as np
+import pytest
+
+import riskEngine
+from decisionService import decision_engine
+
+FIELDS = ('credit_score', 'property_value', 'loan_amount', 'monthly_income', 'monthly_expenses',
+          'stable_employment_years', 'late_payments', 'has_bankruptcy')
+
+
+def random_rows(count, seed=1234):
+    rng = np.random.default_rng(seed)
+    property_value = rng.uniform(50000, 1000000, count).round()
+    monthly_income = rng.uniform(1000, 20000, count).round()
+    rows = {
+        'credit_score': rng.integers(300, 900, count).astype(float),
+        'property_value': np.where(rng.random(count) < 0.02, 0.0, property_value),
+        'loan_amount': (property_value * rng.uniform(0, 1.2, count)).round(),
+        'monthly_income': np.where(rng.random(count) < 0.02, 0.0, monthly_income),
+        'monthly_expenses': (monthly_income * rng.uniform(0, 0.8, count)).round(),
+        'stable_employment_years': rng.integers(0, 10, count),
+        'late_payments': rng.integers(0, 5, count),
+        'has_bankruptcy': rng.random(count) < 0.1,
+    }
+    return [{name: rows[name][i].item() for name in FIELDS} for i in range(count)]
+
+
+def boundary_rows():
+    base = {'credit_score': 750.0, 'property_value': 1000000.0, 'loan_amount': 500000.0,
+            'monthly_income': 10000.0, 'monthly_expenses': 3000.0,
+            'stable_employment_years': 5, 'late_payments': 0, 'has_bankruptcy': False}
+    changes = [
+        {},
+        # Unscorable rows
+        {'monthly_income': 0.0},
+        {'property_value': 0.0},
+        {'monthly_income': 0.0, 'property_value': 0.0},
+        # Each rule exactly at its limit, then just past it
+        {'credit_score': 700.0},
+        {'credit_score': 699.0},
+        {'monthly_expenses': 4500.0},
+        {'monthly_expenses': 4501.0},
+        {'loan_amount': 850000.0},
+        {'loan_amount': 850001.0},
+        {'stable_employment_years': 2},
+        {'stable_employment_years': 1},
+        # Risk scores exactly on the rate tier thresholds (80, 70, 60)
+        {'credit_score': 700.0, 'stable_employment_years': 2, 'monthly_expenses': 2500.0, 'loan_amount': 100000.0},
+        {'credit_score': 700.0, 'stable_employment_years': 2, 'monthly_expenses': 3500.0, 'loan_amount': 100000.0},
+        {'credit_score': 700.0, 'stable_employment_years': 2, 'monthly_expenses': 4500.0, 'loan_amount': 100000.0},
+        # Refused on the default probability alone, and with every flag set
+        {'late_payments': 4, 'has_bankruptcy': True},
+        {'credit_score': 300.0, 'monthly_expenses': 9000.0, 'loan_amount': 1200000.0,
+         'stable_employment_years': 0, 'late_payments': 4, 'has_bankruptcy': True},
+    ]
+    return [dict(base, **change) for change in changes]
+
+
+def vectorized_decisions(rows, policies):
+    columns = {name: np.array([row[name] for row in rows]) for name in FIELDS}
+    scores = riskEngine.score_applications(**columns, policies=policies)
+    assert scores['policy_version'] == policies.version
+    decisions = []
+    for i in range(len(rows)):
+        if scores['error'][i]:
+            decisions.append({'error': True})
+            continue
+        approved = bool(scores['approved'][i])
+        decisions.append({
+            'error': False,
+            'approved': approved,
+            'risk_score': float(scores['risk_score'][i]),
+            'default_probability': float(scores['default_probability'][i]),
+            'interest_rate': float(scores['interest_rate'][i]) if approved else None,
+            'reasons': [] if approved else [riskEngine.POLICY_VIOLATIONS[name]
+                                            for name, mask in scores['violations'].items() if mask[i]],
+        })
+    return decisions
+
+
+def scalar_decision(row):
+    decision = decision_engine._evaluate(**row, property_valuation=row['property_value'])
+    if decision.error:
+        return {'error': True}
+    return {
+        'error': False,
+        'approved': decision.approved,
+        'risk_score': decision.risk_score,
+        'default_probability': decision.default_probability,
+        'interest_rate': decision.interest_rate,
+        'reasons': list(decision.reasons),
+    }
+
+
+@pytest.mark.parametrize('rows', [random_rows(3000), boundary_rows()], ids=['random', 'boundary'])
+def test_score_applications_matches_decision_service(rows):
+    policies = decision_engine.policies.current()
+    expected = [scalar_decision(row) for row in rows]
+    assert vectorized_decisions(rows, policies) == expected
+
+
+def test_boundary_rows_cover_every_outcome():
+    decisions = [scalar_decision(row) for row in boundary_rows()]
+    rates = {d['interest_rate'] for d in decisions if not d['error'] and d['approved']}
+    assert any(d['error'] for d in decisions)
+    assert any(not d['error'] and not d['approved'] and not d['reasons'] for d in decisions)
+    assert len(rates) == len(decision_engine.policies.current().rate_tiers)
@@ -0,0 +1,126 @@
+# Every transport must give the results of the in-process services
+
+import glob
+import os
+import random
+import subprocess
+
+import pytest
+
+import config
+import exec as stack
+from applicationGenerator import generate_applications
+from parsedApplication import ParsedApplication
+from serviceComposite import ServiceComposite
+from transports import create_transport
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WIRE_TRANSPORTS = ('soap', 'json', 'msgpack')
+
+
+def sample_applications():
+    texts = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'data', '*.txt'))):
+        with open(path, encoding='utf-8') as f:
+            texts.append(f.read())
+    # In a protected area of Paris: rejected by the property evaluation
+    texts.append(texts[0].replace("Triangle d'Or", 'Marais'))
+    return texts + list(generate_applications(20, seed=3))
+
+
+@pytest.fixture(scope='module')
+def backends(tmp_path_factory):
+    """The backend services, started for the module unless already running"""
+    processes = []
+    if not all(stack.is_ready(port) for _, _, port in stack.BACKENDS):
+        cwd = os.getcwd()
+        os.chdir(ROOT)
+        try:
+            launched = [stack.launch(*backend, output=subprocess.DEVNULL) for backend in stack.BACKENDS]
+        finally:
+            os.chdir(cwd)
+        processes = [process for process, _ in launched]
+        try:
+            for (name, _, port), (process, started) in zip(stack.BACKENDS, launched):
+                stack.wait_ready(name, port, process, started)
+        except (RuntimeError, TimeoutError):
+            stack.stop_stack(processes)
+            raise
+    # A fresh WSDL cache, so the suds clients see the current service schemas
+    wsdl_cache_dir = config.WSDL_CACHE_DIR
+    config.WSDL_CACHE_DIR = str(tmp_path_factory.mktemp('wsdl_cache'))
+    yield
+    config.WSDL_CACHE_DIR = wsdl_cache_dir
+    stack.stop_stack(processes)
+
+
+def run_single(transport, texts):
+    service = ServiceComposite(concurrent=False, transport=transport, storage='memory')
+    # Financial histories are simulated: the same seed gives every transport the same ones
+    random.seed(42)
+    results = []
+    for index, text in enumerate(texts):
+        try:
+            results.append(service.process_and_store(f'client-{index}', text))
+        except ValueError as e:
+            results.append(f'ValueError: {e}')
+    return results
+
+
+def run_batch(transport, texts):
+    service = ServiceComposite(concurrent=False, transport=transport, storage='memory')
+    random.seed(42)
+    outcomes = service.process_batch([(f'client-{index}', text) for index, text in enumerate(texts)])
+    return [f'ValueError: {outcome}' if isinstance(outcome, ValueError) else outcome
+            for outcome in outcomes]
+
+
+@pytest.mark.parametrize('transport', WIRE_TRANSPORTS)
+@pytest.mark.parametrize('run', [run_single, run_batch], ids=['process_and_store', 'process_batch'])
+def test_wire_transport_matches_local(backends, transport, run):
+    texts = sample_applications()
+    expected = run('local', texts)
+    # Both outcomes occur, so the comparison covers both paths
+    assert any(isinstance(result, dict) for result in expected)
+    assert any(isinstance(result, str) for result in expected)
+    assert run(transport, texts) == expected
+
+
+@pytest.mark.parametrize('transport', WIRE_TRANSPORTS)
+def test_wire_transport_extracts_like_local(backends, transport):
+    texts = sample_applications()[:5]
+    local, wire = create_transport('local'), create_transport(transport)
+    expected = local.text_to_json_batch(texts)
+    assert wire.text_to_json_batch(texts) == expected
+    assert [wire.text_to_json(text) for text in texts] == expected
+
+
+def model_fields(reply):
+    fields = {name: getattr(reply, name) for name in reply._type_info}
+    if 'reasons' in fields:
+        # Absent and empty arrays look alike on the wire
+        fields['reasons'] = list(fields['reasons'] or [])
+    return fields
+
+
+@pytest.mark.parametrize('transport', ('json', 'msgpack'))
+def test_local_transport_coerces_arguments(backends, transport):
+    """Arguments as loosely typed as the JSON protocols accept them (integers
+    for floats, floats for integers, 0 for False): the local transport must
+    convert them the way the services decode them"""
+    local, wire = create_transport('local'), create_transport(transport)
+
+    for text in sample_applications():
+        application = ParsedApplication.from_text(text)
+        request = dict(application.property_info(), size_sqm=int(application.size_sqm or 0))
+        assert model_fields(local.evaluate_property(**request)) == model_fields(wire.evaluate_property(**request))
+
+    credit_request = {'monthly_income': 4000.0, 'monthly_expenses': 1500.0, 'outstanding_debt': 1003.0,
+                      'late_payments': 1.0, 'has_bankruptcy': 0}
+    assert local.credit_check(**credit_request) == wire.credit_check(**credit_request)
+
+    decision_request = {'credit_score': 750, 'property_value': 400000, 'loan_amount': 300000,
+                        'monthly_income': 5000, 'monthly_expenses': 1500, 'stable_employment_years': 3,
+                        'late_payments': 1, 'has_bankruptcy': 0, 'property_valuation': 400000}
+    assert (model_fields(local.evaluate_loan_application(**decision_request))
+            == model_fields(wire.evaluate_loan_application(**decision_request)))
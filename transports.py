@@ -0,0 +1,410 @@
+# transports.py
+
+import http.client
+import json
+import logging
+import queue
+import threading
+import urllib.parse
+from contextlib import contextmanager, ExitStack
+import msgpack
+from suds.client import Client
+from suds.cache import ObjectCache
+from spyne.model.complex import Array
+import config
+import metrics
+import resilience
+from logConfig import request_headers
+from extractService import extract_fields
+from checkSolvabService import assess_solvency
+from propEvalService import property_evaluation_service, PropertyEvaluation
+from decisionService import approval_decision_service, LoanDecision
+
+SUDS_CLIENT_SECONDS = metrics.histogram(
+    'loan_suds_client_create_seconds', "Time to build a suds client (WSDL fetch or cache load)", ('service',))
+SUDS_POOL_WAIT_SECONDS = metrics.histogram(
+    'loan_suds_pool_wait_seconds', "Time spent waiting for a pooled suds client when the pool is exhausted", ('service',))
+
+
+def service_name(wsdl_url):
+    """Service name from its WSDL URL (credit_check_service...), used as
+    metrics label and timeout / circuit breaker key"""
+    return wsdl_url.split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+
+
+def suds_http_status(error):
+    """(status, description) of the HTTP error of a suds call, None for
+    other errors. suds raises SOAP faults as WebFault, and HTTP errors
+    without a fault as a bare Exception((status, description))."""
+    if type(error) is Exception and len(error.args) == 1:
+        status = error.args[0]
+        if isinstance(status, tuple) and len(status) == 2 and isinstance(status[0], int):
+            return status
+    return None
+
+
+class SudsClientPool:
+    """Pool of suds clients for one service.
+
+    A suds Client is not thread-safe, so each thread checks a client out for
+    the duration of a call. Clients are only created on first use: the first
+    one fetches and parses the WSDL unless it is already in the on-disk
+    cache, and the others load the parsed WSDL from that cache.
+
+    Calls made with a checked out client are bounded by the timeout of the
+    service and the request deadline, and go through the service circuit
+    breaker (see resilience.py).
+    """
+
+    def __init__(self, wsdl_url, size=None, cache=None):
+        self.wsdl_url = wsdl_url
+        self.name = service_name(wsdl_url)
+        self.breaker = resilience.breaker(self.name)
+        self.size = size or config.SUDS_POOL_SIZE
+        self.cache = cache
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create(self, timeout):
+        # Client.clone() deep-copies the suds options, which recurses forever on
+        # recent Pythons, so every pooled client is built from the cached WSDL
+        with SUDS_CLIENT_SECONDS.time(service=self.name):
+            return Client(self.wsdl_url, cache=self.cache, timeout=timeout)
+
+    @contextmanager
+    def client(self):
+        timeout = resilience.call_timeout(self.name)
+        try:
+            client = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    client = self._create(timeout)
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                # Pool exhausted, wait for another thread to return a client
+                with SUDS_POOL_WAIT_SECONDS.time(service=self.name):
+                    try:
+                        client = self._idle.get(timeout=timeout)
+                    except queue.Empty:
+                        raise TimeoutError(f"No {self.name} client free after {timeout:.1f}s") from None
+        # Pass the request ID and trace flag of the caller on to the service
+        client.set_options(headers=request_headers(), timeout=timeout)
+        try:
+            with self.breaker.guard():
+                try:
+                    yield client
+                except Exception as e:
+                    status = suds_http_status(e)
+                    if status is None:
+                        raise
+                    raise resilience.ServiceError(self.name, *status) from None
+        finally:
+            self._idle.put(client)
+
+    def warm_up(self, count):
+        """Create up to count clients ahead of the first request"""
+        with ExitStack() as checkouts:
+            try:
+                for _ in range(min(count, self.size)):
+                    checkouts.enter_context(self.client())
+            except Exception as e:
+                logging.warning(f"Warm-up of {self.wsdl_url} failed, clients will be created on first use: {e}")
+
+
+class SoapTransport:
+    """Calls the backend services over SOAP through pooled suds clients"""
+
+    def __init__(self, pool_size=None, warm_up=None):
+        cache = ObjectCache(location=config.WSDL_CACHE_DIR, days=config.WSDL_CACHE_DAYS)
+        self.extract_pool = SudsClientPool(config.SERVICE_WSDL_EXTRACT, pool_size, cache)
+        self.solvency_pool = SudsClientPool(config.SERVICE_WSDL_SOLVENCY, pool_size, cache)
+        self.property_pool = SudsClientPool(config.SERVICE_WSDL_PROPERTY, pool_size, cache)
+        self.approval_pool = SudsClientPool(config.SERVICE_WSDL_APPROVAL, pool_size, cache)
+
+        warm_up = config.SUDS_POOL_WARMUP if warm_up is None else warm_up
+        if warm_up:
+            for pool in (self.extract_pool, self.solvency_pool, self.property_pool, self.approval_pool):
+                pool.warm_up(warm_up)
+
+    @staticmethod
+    def _to_array(client, type_name, items):
+        """Build the suds <type_name>Array argument of a batch call from a list of dicts"""
+        array = client.factory.create(f'{type_name}Array')
+        entries = []
+        for item in items:
+            entry = client.factory.create(type_name)
+            for key, value in item.items():
+                setattr(entry, key, value)
+            entries.append(entry)
+        setattr(array, type_name, entries)
+        return array
+
+    @staticmethod
+    def _from_array(response, item_name='string'):
+        """Unwrap the <item_name>Array returned by a batch call"""
+        return list(getattr(response, item_name, None) or [])
+
+    @classmethod
+    def _to_model(cls, model, reply):
+        """Copy a suds reply object into the spyne ComplexModel returned by the service"""
+        values = {}
+        for name, field_type in model._type_info.items():
+            value = getattr(reply, name, None)
+            if value is not None and issubclass(field_type, Array):
+                value = [str(item) for item in cls._from_array(value)]
+            elif isinstance(value, str):
+                value = str(value)
+            values[name] = value
+        return model(**values)
+
+    def text_to_json(self, text):
+        with self.extract_pool.client() as client:
+            return client.service.text_to_json(text)
+
+    def text_to_json_batch(self, texts):
+        with self.extract_pool.client() as client:
+            array = client.factory.create('stringArray')
+            array.string = list(texts)
+            return self._from_array(client.service.text_to_json_batch(array))
+
+    def credit_check(self, **request):
+        with self.solvency_pool.client() as client:
+            return client.service.credit_check(**request)
+
+    def credit_check_batch(self, requests):
+        with self.solvency_pool.client() as client:
+            return self._from_array(client.service.credit_check_batch(
+                self._to_array(client, 'CreditCheckRequest', requests)
+            ))
+
+    def evaluate_property(self, **request):
+        with self.property_pool.client() as client:
+            return self._to_model(PropertyEvaluation, client.service.evaluate_property(**request))
+
+    def evaluate_property_batch(self, requests):
+        with self.property_pool.client() as client:
+            replies = self._from_array(client.service.evaluate_property_batch(
+                self._to_array(client, 'PropertyRequest', requests)
+            ), 'PropertyEvaluation')
+        return [self._to_model(PropertyEvaluation, reply) for reply in replies]
+
+    def evaluate_loan_application(self, **application):
+        with self.approval_pool.client() as client:
+            return self._to_model(LoanDecision, client.service.evaluate_loan_application(**application))
+
+    def evaluate_loan_application_batch(self, applications):
+        with self.approval_pool.client() as client:
+            replies = self._from_array(client.service.evaluate_loan_application_batch(
+                self._to_array(client, 'LoanApplication', applications)
+            ), 'LoanDecision')
+        return [self._to_model(LoanDecision, reply) for reply in replies]
+
+
+class ServiceFault(Exception):
+    """Fault returned by a service over a compact protocol"""
+
+
+class DocumentTransport:
+    """Calls the backend services over a compact document protocol (JSON or
+    MessagePack, see serviceRunner.COMPACT_PROTOCOLS).
+
+    Requests skip the SOAP envelope and the suds client entirely: the body
+    is {"<method>": {<arguments>}} and the response is the bare return value.
+    Each thread keeps one persistent HTTP connection per service. Calls are
+    bounded and guarded like those of SoapTransport (see resilience.py).
+    """
+
+    protocol = None
+    content_type = None
+
+    def __init__(self):
+        self.extract_url = self._endpoint(config.SERVICE_WSDL_EXTRACT)
+        self.solvency_url = self._endpoint(config.SERVICE_WSDL_SOLVENCY)
+        self.property_url = self._endpoint(config.SERVICE_WSDL_PROPERTY)
+        self.approval_url = self._endpoint(config.SERVICE_WSDL_APPROVAL)
+        self._local = threading.local()
+
+    def _endpoint(self, wsdl_url):
+        """(service, host, port, path) of the compact endpoint next to a SOAP service"""
+        url = urllib.parse.urlsplit(wsdl_url)
+        return service_name(wsdl_url), url.hostname, url.port or 80, f"{url.path.rstrip('/')}.{self.protocol}"
+
+    def _connection(self, host, port):
+        connections = self._local.__dict__.setdefault('connections', {})
+        connection = connections.get((host, port))
+        if connection is None:
+            connection = connections[(host, port)] = http.client.HTTPConnection(host, port)
+        return connection
+
+    def _call(self, endpoint, method, **arguments):
+        service, host, port, path = endpoint
+        body = self.encode({method: arguments})
+        headers = {'Content-Type': self.content_type, **request_headers()}
+        connection = self._connection(host, port)
+        connection.timeout = resilience.call_timeout(service)
+        if connection.sock is not None:
+            connection.sock.settimeout(connection.timeout)
+        with resilience.breaker(service).guard():
+            try:
+                try:
+                    connection.request('POST', path, body, headers)
+                    response = connection.getresponse()
+                except (http.client.HTTPException, ConnectionError):
+                    # Keep-alive connection dropped by the server, retry on a new one
+                    connection.close()
+                    connection.request('POST', path, body, headers)
+                    response = connection.getresponse()
+                data = response.read()
+            except TimeoutError:
+                # The reply may still come: never reuse the connection for another call
+                connection.close()
+                raise
+            if response.status != 200:
+                try:
+                    fault = self.decode(data).get('faultstring')
+                except Exception:
+                    fault = None
+                if fault is None:
+                    raise resilience.ServiceError(service, response.status, data[:200])
+                raise ServiceFault(f"{method}: HTTP {response.status} {fault}")
+        return self.decode(data)
+
+    @staticmethod
+    def _to_model(model, reply):
+        return model(**{name: reply.get(name) for name in model._type_info})
+
+    def text_to_json(self, text):
+        return self._call(self.extract_url, 'text_to_json', text=text)
+
+    def text_to_json_batch(self, texts):
+        return self._call(self.extract_url, 'text_to_json_batch', texts=texts) or []
+
+    def credit_check(self, **request):
+        return self._call(self.solvency_url, 'credit_check', **request)
+
+    def credit_check_batch(self, requests):
+        return self._call(self.solvency_url, 'credit_check_batch', requests=requests) or []
+
+    def evaluate_property(self, **request):
+        return self._to_model(PropertyEvaluation, self._call(self.property_url, 'evaluate_property', **request))
+
+    def evaluate_property_batch(self, requests):
+        replies = self._call(self.property_url, 'evaluate_property_batch', requests=requests) or []
+        return [self._to_model(PropertyEvaluation, reply) for reply in replies]
+
+    def evaluate_loan_application(self, **application):
+        return self._to_model(LoanDecision, self._call(
+            self.approval_url, 'evaluate_loan_application', **application))
+
+    def evaluate_loan_application_batch(self, applications):
+        replies = self._call(self.approval_url, 'evaluate_loan_application_batch',
+                             applications=applications) or []
+        return [self._to_model(LoanDecision, reply) for reply in replies]
+
+
+class JsonTransport(DocumentTransport):
+    protocol = 'json'
+    content_type = 'application/json'
+
+    @staticmethod
+    def encode(document):
+        return json.dumps(document).encode()
+
+    @staticmethod
+    def decode(data):
+        return json.loads(data)
+
+
+class MsgpackTransport(DocumentTransport):
+    protocol = 'msgpack'
+    content_type = 'application/x-msgpack'
+
+    @staticmethod
+    def encode(document):
+        # spyne's MessagePackDocument looks the method wrapper up by its
+        # bytes name; the argument names can stay strings
+        return msgpack.packb({method.encode(): arguments for method, arguments in document.items()},
+                             use_bin_type=True)
+
+    @classmethod
+    def decode(cls, data):
+        return cls._strings(msgpack.unpackb(data, raw=False))
+
+    @classmethod
+    def _strings(cls, value):
+        """spyne packs keys and strings as bin: turn them back into str"""
+        if isinstance(value, bytes):
+            return value.decode()
+        if isinstance(value, dict):
+            return {cls._strings(key): cls._strings(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [cls._strings(item) for item in value]
+        return value
+
+
+class LocalTransport:
+    """Runs the backend service logic in-process, without any network hop.
+
+    Arguments are coerced to the types declared by the RPC signatures so
+    that both transports return identical results.
+    """
+
+    def __init__(self):
+        self.property_service = property_evaluation_service()
+        self.approval_service = approval_decision_service()
+
+    def text_to_json(self, text):
+        return extract_fields(text)
+
+    def text_to_json_batch(self, texts):
+        return [extract_fields(text) for text in texts]
+
+    def credit_check(self, monthly_income, monthly_expenses, outstanding_debt,
+                     late_payments, has_bankruptcy):
+        return assess_solvency(int(monthly_income), int(monthly_expenses), int(outstanding_debt),
+                               int(late_payments), bool(has_bankruptcy))
+
+    def credit_check_batch(self, requests):
+        return [self.credit_check(**request) for request in requests]
+
+    def evaluate_property(self, location, property_type, size_sqm, description, postcode=None):
+        return self.property_service._evaluate(location, property_type, float(size_sqm), description, postcode)
+
+    def evaluate_property_batch(self, requests):
+        return [self.evaluate_property(**request) for request in requests]
+
+    def evaluate_loan_application(self, credit_score, property_value, loan_amount,
+                                  monthly_income, monthly_expenses, stable_employment_years,
+                                  late_payments, has_bankruptcy, property_valuation):
+        return self.approval_service._evaluate(
+            float(credit_score), float(property_value), float(loan_amount),
+            float(monthly_income), float(monthly_expenses), int(stable_employment_years),
+            int(late_payments), bool(has_bankruptcy), float(property_valuation)
+        )
+
+    def evaluate_loan_application_batch(self, applications):
+        return [self.evaluate_loan_application(**application) for application in applications]
+
+
+TRANSPORTS = {
+    'soap': SoapTransport,
+    'json': JsonTransport,
+    'msgpack': MsgpackTransport,
+    'local': LocalTransport,
+}
+
+
+def create_transport(name=None):
+    name = name or config.TRANSPORT
+    if name not in TRANSPORTS:
+        raise ValueError(f"Transport inconnu: {name} (choix: {', '.join(TRANSPORTS)})")
+    return TRANSPORTS[name]()
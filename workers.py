@@ -0,0 +1,123 @@
+# workers.py
+"""
+Pre-forked worker processes sharing one listening socket.
+
+The first process of a service (the supervisor) binds the port, then
+starts LOAN_WORKERS - 1 copies of the same script that inherit the
+listening socket through LOAN_LISTEN_FD, and serves requests itself too.
+The kernel hands each incoming connection to one of the processes
+accepting on the socket, so CPU-bound work (XML validation, envelope
+building) spreads over the cores.
+
+Every worker is an independent process: in-memory state such as caches
+or the async job queue is per worker. Metrics are the exception: the
+workers share them through a directory created by the supervisor
+(LOAN_METRICS_DIR, see metrics.share()), so /metrics gives the totals of
+the service whichever worker answers.
+"""
+
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+
+import metrics
+
+LISTEN_FD_ENV = 'LOAN_LISTEN_FD'
+WORKER_INDEX_ENV = 'LOAN_WORKER_INDEX'
+METRICS_DIR_ENV = 'LOAN_METRICS_DIR'
+
+
+def inherited_socket():
+    """File descriptor of the listening socket passed by the supervisor, or None"""
+    fd = os.environ.get(LISTEN_FD_ENV)
+    return int(fd) if fd else None
+
+
+def worker_index():
+    """0 for the supervisor, 1..n-1 for the workers it started"""
+    return int(os.environ.get(WORKER_INDEX_ENV, 0))
+
+
+def listen_socket(port, host='0.0.0.0', backlog=128):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    # Non-blocking, as twisted expects: a worker losing the race for a
+    # connection must not block in accept()
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """Starts the worker copies of the current script and restarts those
+    that die, until stop()"""
+
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, sock, count, metrics_dir=None):
+        self.sock = sock
+        self.count = count
+        self.metrics_dir = metrics_dir
+        self.processes = {}
+        self._stopped = threading.Event()
+
+    def _spawn(self, index):
+        env = dict(os.environ, **{LISTEN_FD_ENV: str(self.sock.fileno()), WORKER_INDEX_ENV: str(index)})
+        self.processes[index] = subprocess.Popen([sys.executable] + sys.argv, env=env,
+                                                 pass_fds=[self.sock.fileno()])
+
+    def start(self):
+        for index in range(1, self.count):
+            self._spawn(index)
+        threading.Thread(target=self._watch, name='worker-supervisor', daemon=True).start()
+
+    def _watch(self):
+        while not self._stopped.wait(self.CHECK_INTERVAL):
+            for index, process in list(self.processes.items()):
+                if process.poll() is not None and not self._stopped.is_set():
+                    logging.warning(f"Worker {index} exited with code {process.returncode}, restarting")
+                    self._spawn(index)
+
+    def stop(self):
+        self._stopped.set()
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self.metrics_dir:
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+
+def prefork(port, count, host='0.0.0.0'):
+    """Listening socket of this process for count workers on port.
+
+    In a worker, the socket inherited from the supervisor. Otherwise a new
+    socket, with the other count - 1 workers started on it when count > 1.
+    Either way the metrics registry is shared with the other workers.
+    Returns (socket, supervisor or None).
+    """
+    fd = inherited_socket()
+    if fd is not None:
+        if os.environ.get(METRICS_DIR_ENV):
+            metrics.share(os.environ[METRICS_DIR_ENV], worker_index())
+        return socket.socket(fileno=fd), None
+    sock = listen_socket(port, host)
+    if count <= 1:
+        return sock, None
+    # Inherited by the workers through the environment
+    metrics_dir = os.environ[METRICS_DIR_ENV] = tempfile.mkdtemp(prefix='loan_metrics_')
+    metrics.share(metrics_dir, 0)
+    supervisor = Supervisor(sock, count, metrics_dir)
+    supervisor.start()
+    return sock, supervisor